@@ -5,13 +5,44 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     OPENAI_MODEL: str = "gpt-4.1-mini"
     OPENAI_EMBED_MODEL: str = "text-embedding-3-small"
+    LLM_MAX_CONNECTIONS: int = 200
+    LLM_MAX_KEEPALIVE: int = 50
+    LLM_KEEPALIVE_EXPIRY_S: float = 60.0
+    LLM_TIMEOUT_S: float = 60.0
+    LLM_CONNECT_TIMEOUT_S: float = 5.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_REFINE: bool = False  # default for ?refine=: polish the local planner's stacks with the LLM
+    LLM_BUDGET_LIGHTING_S: float = 4.0  # past this, decide() answers with the offline plan
+    LLM_BUDGET_DEEP_DIVE_S: float = 8.0
+    LLM_BUDGET_COPY_S: float = 30.0
+    LLM_CONTEXT_TOKEN_BUDGET: int = 1200  # retrieved KB context per prompt, best-ranked records first
+    LLM_HEDGE_AFTER_S: float = 2.0  # hedge delay until enough latency samples exist
+    LLM_HEDGE_QUANTILE: float = 0.9
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_FLOOR_S: float = 0.25
+    DECISION_CACHE_SIZE: int = 2048
+    DECISION_CACHE_TTL_S: float = 7 * 24 * 3600.0
+    DECISION_CACHE_PATH: str | None = None  # e.g. ./data/cache.sqlite to persist across restarts
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_CONCURRENCY: int = 16  # in-flight decide() calls per batch request
+    EXPORT_WORKERS: int = 8  # concurrent copy-pack LLM calls
+    EXPORT_QUEUE_MAX: int = 1000
+    EXPORT_RENDER_PROCESSES: int = 2  # 0 renders in the threadpool instead of a process pool
+    EXPORT_JOB_STALE_S: float = 600.0  # "running" jobs older than this are retried on startup
     DB_URL: str = "sqlite:///./data/launchpad.db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_BUSY_TIMEOUT_MS: int = 10000
     KB_SQLITE_PATH: str = "./data/kb.sqlite"
+    KB_RETRIEVER: str = "bm25"  # bm25 | vector
+    KB_EMBEDDER: str = "hash"  # hash (offline feature hashing) | openai (OPENAI_EMBED_MODEL)
     DATA_DIR: str = "./data"
     EXPORT_DIR: str = "./exports"
+    DOCX_TEMPLATE_PATH: str | None = None  # optional pre-styled .docx to start every export from
     CATALOG_DOCX_PATH: str = "./VUE Services 2026.docx"
     BIASES_DOCX_PATH: str = "./Biases.docx"
     SKU_XLSX_PATH: str = "./VUE_Services_SKU_Prices.xlsx"
+    METRICS_SERVER_TIMING: bool = False  # add a Server-Timing header with per-stage durations
     cors_allow_origins: List[str] = ["*"]
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
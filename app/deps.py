@@ -1,14 +1,100 @@
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlmodel import SQLModel, create_engine, Session
 from app.config import settings
-import os
+from app.services import metrics
+import os, time
 
 if not os.path.exists("./data"):
     os.makedirs("./data", exist_ok=True)
-engine = create_engine(settings.DB_URL, echo=False)
+
+def _make_engine(url: str) -> Engine:
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=False, pool_pre_ping=True,
+                             pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return create_engine(url, echo=False, connect_args={"check_same_thread": False})
+    eng = create_engine(url, echo=False, pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW,
+                        connect_args={"check_same_thread": False, "timeout": settings.DB_BUSY_TIMEOUT_MS / 1000})
+
+    @event.listens_for(eng, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        # WAL lets readers run alongside the single writer; NORMAL is durable in WAL mode
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT_MS)}")
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.close()
+    return eng
+
+engine = _make_engine(settings.DB_URL)
+
+# every Session.commit (routers and export jobs alike), flush included, as the db_commit stage
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_t0"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _commit_done(session):
+    t0 = session.info.pop("commit_t0", None)
+    if t0 is not None:
+        metrics.record("db_commit", time.perf_counter() - t0)
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+# Short-lived sessions for async handlers. These block (commits can wait up to
+# DB_BUSY_TIMEOUT_MS on a lock), so call them through run_in_threadpool, never on the loop.
+def fetch(model, key):
+    with Session(engine, expire_on_commit=False) as session:
+        return session.get(model, key)
+
+def save(*rows):
+    """Add and commit rows in one transaction; their attributes stay readable afterwards."""
+    with Session(engine, expire_on_commit=False) as session:
+        session.add_all(rows); session.commit()
+
+SCHEMA_VERSION = 4
+
+def _add_missing_columns(conn):
+    # create_all never alters existing tables; backfill nullable columns added to the models since
+    insp = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name not in have and col.nullable:
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" '
+                                  f'{col.type.compile(conn.dialect)}'))
+
+def _create_missing_indexes(conn):
+    for table in SQLModel.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(conn, checkfirst=True)
+
+# version -> migration taking a connection inside the init_db transaction
+MIGRATIONS = {
+    2: _add_missing_columns,  # ExportJob.error / updated_at
+    3: _create_missing_indexes,  # Intake.created_at / mode, ExportJob.intake_id
+    4: _add_missing_columns,  # ExportJob.export_key
+}
+
 def init_db():
+    """Create tables and bring the schema up to SCHEMA_VERSION. Run once at startup."""
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        row = conn.execute(text("SELECT version FROM schema_version")).first()
+        current = row[0] if row else 1
+        if current > SCHEMA_VERSION:
+            raise RuntimeError(f"database schema v{current} is newer than this build (v{SCHEMA_VERSION})")
+        for v in range(current + 1, SCHEMA_VERSION + 1):
+            if v in MIGRATIONS:
+                MIGRATIONS[v](conn)
+        if row is None:
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": SCHEMA_VERSION})
+        elif current != SCHEMA_VERSION:
+            conn.execute(text("UPDATE schema_version SET version = :v"), {"v": SCHEMA_VERSION})
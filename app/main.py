@@ -1,15 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import os, json
+import asyncio, os, json
 from app.config import settings
-from app.routers import intake, export, admin
+from app.routers import intake, export, admin, history
+from app.deps import init_db
+from app.services import llm_client, export_jobs, kb_store, metrics
 
-app = FastAPI(title="LaunchPad AI Decision Engine", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    await asyncio.to_thread(kb_store.warm)
+    await llm_client.startup()
+    await export_jobs.queue.start()
+    yield
+    await export_jobs.queue.stop()
+    await llm_client.shutdown()
+
+app = FastAPI(title="LaunchPad AI Decision Engine", version="1.0.0", lifespan=lifespan)
 
 from fastapi.staticfiles import StaticFiles
 from app.config import settings
 
 # ...
+os.makedirs(settings.EXPORT_DIR, exist_ok=True)
 app.mount("/exports", StaticFiles(directory=settings.EXPORT_DIR), name="exports")
 
 app.add_middleware(
@@ -20,13 +35,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_SERVER_TIMING:
+    app.add_middleware(metrics.ServerTimingMiddleware)
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(intake.router, prefix="/intake", tags=["intake"])
 app.include_router(export.router, prefix="/export", tags=["export"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
+app.include_router(history.router, tags=["history"])
 
 @app.get("/schemas", tags=["meta"])
 def get_schemas():
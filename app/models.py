@@ -1,22 +1,27 @@
-from sqlmodel import SQLModel, Field
-from typing import Optional, Dict, Any
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field, Column, JSON
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 import uuid
 
 class Intake(SQLModel, table=True):
+    __table_args__ = (Index("ix_intake_mode_created_at", "mode", "created_at"),)
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
-    mode: str  # "lighting" | "deep_dive"
-    answers: Dict[str, Any]
-    signals: Dict[str, Any]
-    stacks: Dict[str, Any]  # three stacks + rationales
-    biases: Dict[str, Any]  # top 3 bias mini-plans
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    mode: str  # "lighting" | "deep_dive"; indexed via ix_intake_mode_created_at
+    answers: Dict[str, Any] = Field(sa_column=Column(JSON))
+    signals: Dict[str, Any] = Field(sa_column=Column(JSON))
+    stacks: List[Dict[str, Any]] = Field(sa_column=Column(JSON))  # three stacks + rationales
+    biases: List[Dict[str, Any]] = Field(sa_column=Column(JSON))  # top 3 bias mini-plans
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class ExportJob(SQLModel, table=True):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
-    intake_id: str
+    intake_id: str = Field(index=True)
     chosen_tier: str
     chosen_bias_key: str
-    status: str = "pending"  # pending|done|error
+    export_key: Optional[str] = None  # export_cache.export_key at submit time; the job renders under it
+    status: str = "pending"  # pending|running|done|error
     file_path: Optional[str] = None
+    error: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
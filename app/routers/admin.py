@@ -1,10 +1,23 @@
-from fastapi import APIRouter
-from app.services import ingest_docx, kb_store
+from fastapi import APIRouter, HTTPException
+from app.services import copywriter, kb_store, llm_decider
 
 router = APIRouter()
 
-@router.post("/reload-kb")
-def reload_kb():
-    ingest_docx.build_kb_files()
-    kb_store.build_or_refresh()
-    return {"status": "reloaded"}
+@router.post("/reload-kb", status_code=202)
+def reload_kb(force: bool = False):
+    """Start a background re-ingest (only what changed, unless force) and snapshot swap.
+    Poll statusUrl until status is done; requests keep using the current KB meanwhile."""
+    rid = kb_store.start_reload(force=force)
+    return {**kb_store.reload_status(rid), "statusUrl": f"/admin/reload-kb/{rid}"}
+
+@router.get("/reload-kb/{reload_id}")
+def reload_kb_status(reload_id: str):
+    st = kb_store.reload_status(reload_id)
+    if st is None:
+        raise HTTPException(status_code=404, detail="reload not found")
+    return st
+
+@router.get("/cache-stats")
+def cache_stats():
+    return {"decision": llm_decider.decision_cache.stats(), "kbVersion": kb_store.get_snapshot().version,
+            "singleflight": {"decide": llm_decider.inflight.stats(), "copy": copywriter.inflight.stats()}}
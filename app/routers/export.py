@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os, re
+from urllib.parse import quote
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from sqlmodel import Session, select
-from app.deps import get_session, init_db
+from sqlmodel import Session
+from app.deps import engine, fetch, get_session, save
 from app.models import Intake, ExportJob
-from app.services import copywriter, export_docx
+from app.services import export_cache, export_docx, export_jobs, export_preview
 
 router = APIRouter()
 
@@ -12,20 +16,134 @@ class ExportRequest(BaseModel):
     chosen_tier: str  # High|Medium|Low
     chosen_bias_key: str
 
+def _job_view(job: ExportJob) -> dict:
+    url = f"/exports/{os.path.basename(job.file_path)}" if job.file_path else None
+    return {"jobId": job.id, "intake_id": job.intake_id, "status": job.status, "error": job.error,
+            "downloadUrl": url, "statusUrl": f"/export/jobs/{job.id}"}
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def _attachment(filename: str) -> str:
+    # RFC 6266: an ASCII-only fallback plus the exact name percent-encoded, so quotes or CR/LF in
+    # the tier/bias can't break out of the header
+    fallback = re.sub(r"[^A-Za-z0-9._-]", "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _persist(job_id: str, name: str, data: bytes):
+    path = export_cache.save_docx(name, data)
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        job.file_path = path
+        session.add(job); session.commit()
+
+async def _inline_export(req: ExportRequest, intake: Intake, key: str, request: Request,
+                         background: BackgroundTasks, persist: bool):
+    name = export_cache.docx_name(key, intake.id)
+    etag = f'"{name}"'  # content-addressed, so the name is a strong validator once the pack is stored
+    job = ExportJob(intake_id=intake.id, chosen_tier=req.chosen_tier, chosen_bias_key=req.chosen_bias_key,
+                    export_key=key, status="done", file_path=export_cache.lookup(key, intake.id))
+    headers = {"ETag": etag, "X-Export-Job-Id": job.id,
+               "Content-Disposition": _attachment(f"proposal_{req.chosen_tier}_{req.chosen_bias_key}.docx")}
+    # only stored packs are ever sent with an ETag (fallback packs never are), so only they can 304
+    if (request.headers.get("if-none-match") == etag
+            and await run_in_threadpool(export_cache.load_pack, key) is not None):
+        await run_in_threadpool(save, job)
+        return Response(status_code=304, headers=headers)
+    if job.file_path:
+        data = await run_in_threadpool(_read, job.file_path)
+    else:
+        copy_pack = await export_jobs.copy_pack_for(intake, req.chosen_tier, req.chosen_bias_key, key)
+        data = await export_jobs.render_bytes(intake, copy_pack, req.chosen_tier, req.chosen_bias_key)
+        if copy_pack.get("fallback"):
+            # offline pack: the next request should get the real copy once the LLM is back
+            del headers["ETag"]
+            headers["Cache-Control"] = "no-store"
+        elif persist:
+            background.add_task(_persist, job.id, name, data)
+    await run_in_threadpool(save, job)
+    headers["Content-Length"] = str(len(data))
+    chunks = (data[i:i + 65536] for i in range(0, len(data), 65536))
+    return StreamingResponse(chunks, media_type=DOCX_MIME, headers=headers)
+
 @router.post("/docx")
-def export_docx_endpoint(req: ExportRequest, session: Session = Depends(get_session)):
-    init_db()
-    intake = session.exec(select(Intake).where(Intake.id == req.intake_id)).first()
+async def export_docx_endpoint(req: ExportRequest, request: Request, background: BackgroundTasks,
+                               inline: bool = False, persist: bool = False):
+    """Queue an export and return its jobId at once; poll statusUrl until status is done.
+
+    downloadUrl is the address the .docx will have once the job is done (content-addressed,
+    so a repeat export is returned as done immediately with cached=true).
+
+    With ?inline=true the .docx is rendered in memory and returned as the response body
+    (ETag / If-None-Match supported); ?persist=true also writes it under EXPORT_DIR after
+    the response has been sent."""
+    intake = await run_in_threadpool(fetch, Intake, req.intake_id)
     if not intake:
         raise HTTPException(status_code=404, detail="intake not found")
-    job = ExportJob(intake_id=intake.id, chosen_tier=req.chosen_tier, chosen_bias_key=req.chosen_bias_key)
-    session.add(job); session.commit(); session.refresh(job)
+    tiers = [s["tier"] for s in intake.stacks]
+    if req.chosen_tier.lower() not in {t.lower() for t in tiers}:
+        raise HTTPException(status_code=422, detail=f"chosen_tier must be one of {', '.join(tiers)}")
+    key = export_cache.export_key(intake, req.chosen_tier, req.chosen_bias_key)
+    if inline:
+        return await _inline_export(req, intake, key, request, background, persist)
+    job = ExportJob(intake_id=intake.id, chosen_tier=req.chosen_tier, chosen_bias_key=req.chosen_bias_key,
+                    export_key=key)
+    outpath = export_cache.lookup(key, intake.id)
+    cached = outpath is not None
+    if cached:
+        job.status = "done"; job.file_path = outpath
+    await run_in_threadpool(save, job)
+
+    if not cached:
+        if export_jobs.queue.running:
+            if not export_jobs.queue.submit(job.id):
+                job.status = "error"; job.error = "export queue full"
+                await run_in_threadpool(save, job)
+                raise HTTPException(status_code=503, detail="export queue full, retry later")
+        else:
+            # no lifespan (scripts, bare TestClient): run inline on the threadpool
+            await export_jobs.run_job(job.id)
+            job = await run_in_threadpool(fetch, ExportJob, job.id)
+
+    out = _job_view(job)
+    out["downloadUrl"] = f"/exports/{export_cache.docx_name(job.export_key, job.intake_id)}.docx"
+    out["cached"] = cached
+    return out
 
-    copy_pack = copywriter.generate(intake=intake, chosen_tier=req.chosen_tier, chosen_bias=req.chosen_bias_key)
-    outpath = export_docx.build_doc(intake=intake, copy_pack=copy_pack, chosen_tier=req.chosen_tier,
-                                    chosen_bias=req.chosen_bias_key, job_id=job.id)
-    job.status = "done"; job.file_path = outpath
-    session.add(job); session.commit()
+@router.get("/jobs/{job_id}")
+def export_job_status(job_id: str, session: Session = Depends(get_session)):
+    job = session.get(ExportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="export job not found")
+    return _job_view(job)
 
-    url = f"/exports/{os.path.basename(outpath)}" if outpath else None
-    return {"downloadUrl": url, "jobId": job.id}
+@router.get("/{job_id}/preview")
+async def export_preview_endpoint(job_id: str, request: Request, format: str = "html"):
+    """HTML or Markdown rendering of the job's proposal from the copy pack stored for its .docx.
+
+    Never generates copy: 202 while the job is still pending/running, 409 if it finished
+    without a stored pack (failed, or rendered from the offline fallback)."""
+    if format not in export_preview.RENDERERS:
+        raise HTTPException(status_code=400, detail="format must be html or md")
+    job = await run_in_threadpool(fetch, ExportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="export job not found")
+    intake = await run_in_threadpool(fetch, Intake, job.intake_id)
+    if not intake:
+        raise HTTPException(status_code=404, detail="intake not found")
+    key = job.export_key or export_cache.export_key(intake, job.chosen_tier, job.chosen_bias_key)
+    copy_pack = export_cache.load_pack(key)
+    if copy_pack is None:
+        if job.status in ("pending", "running"):
+            return JSONResponse(_job_view(job), status_code=202, headers={"Retry-After": "2"})
+        raise HTTPException(status_code=409, detail="no stored copy pack for this export; re-export to preview")
+    etag = f'"{export_cache.docx_name(key, intake.id)}.{format}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    render, mime = export_preview.RENDERERS[format]
+    body = render(export_docx.proposal_paragraphs(intake, copy_pack, job.chosen_tier, job.chosen_bias_key))
+    return Response(body, media_type=mime, headers=headers)
@@ -0,0 +1,71 @@
+import base64, binascii
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
+from app.deps import get_session
+from app.models import Intake, ExportJob
+
+router = APIRouter()
+
+_HEAVY = ("answers", "stacks", "biases")
+
+def _encode_cursor(created_at: datetime, row_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def _after(model, cursor: Optional[str]):
+    # keyset predicate for ORDER BY created_at DESC, id DESC
+    if not cursor:
+        return None
+    ts, row_id = _decode_cursor(cursor)
+    return or_(model.created_at < ts, and_(model.created_at == ts, model.id < row_id))
+
+def _page(rows, limit: int, to_item):
+    more = len(rows) > limit
+    rows = rows[:limit]
+    nxt = _encode_cursor(rows[-1].created_at, rows[-1].id) if more else None
+    return {"items": [to_item(r) for r in rows], "nextCursor": nxt}
+
+@router.get("/intakes")
+def list_intakes(mode: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                 include: List[str] = Query([], description="any of answers, stacks, biases"),
+                 session: Session = Depends(get_session)):
+    """Newest first. Pass nextCursor back as cursor for the next page. The large JSON columns
+    are only read when named in include."""
+    unknown = set(include) - set(_HEAVY)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown include: {sorted(unknown)}")
+    cols = [Intake.id, Intake.mode, Intake.signals, Intake.created_at] + [getattr(Intake, f) for f in _HEAVY if f in include]
+    q = select(*cols)
+    if mode:
+        q = q.where(Intake.mode == mode)
+    if since:
+        q = q.where(Intake.created_at >= since)
+    if until:
+        q = q.where(Intake.created_at < until)
+    after = _after(Intake, cursor)
+    if after is not None:
+        q = q.where(after)
+    rows = session.exec(q.order_by(Intake.created_at.desc(), Intake.id.desc()).limit(limit + 1)).all()
+    return _page(rows, limit, lambda r: dict(r._mapping))
+
+@router.get("/intakes/{intake_id}/exports")
+def list_intake_exports(intake_id: str, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                        session: Session = Depends(get_session)):
+    if session.exec(select(Intake.id).where(Intake.id == intake_id)).first() is None:
+        raise HTTPException(status_code=404, detail="intake not found")
+    q = select(ExportJob).where(ExportJob.intake_id == intake_id)
+    after = _after(ExportJob, cursor)
+    if after is not None:
+        q = q.where(after)
+    rows = session.exec(q.order_by(ExportJob.created_at.desc(), ExportJob.id.desc()).limit(limit + 1)).all()
+    return _page(rows, limit, lambda j: j.model_dump())
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
+import asyncio, json
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any
-from app.deps import get_session, init_db
-from app.services import signals, llm_decider
+from typing import Dict, Any, List, Literal, Optional
+from app.config import settings
+from app.deps import save
+from app.services import signals, llm_decider, metrics
 from app.models import Intake
+from app.services.cache import canonical_key
 
 router = APIRouter()
 
@@ -15,21 +19,126 @@ class DeepDivePayload(BaseModel):
     answers: Dict[str, Any] = Field(..., description="40–50 answers per schemas/deep_dive.json")
 
 @router.post("/lighting")
-def intake_lighting(payload: LightingPayload, session: Session = Depends(get_session)):
-    init_db()
-    sigs = signals.compute(payload.answers)
-    result = llm_decider.decide(payload.answers, sigs, mode="lighting")
+async def intake_lighting(payload: LightingPayload, refine: Optional[bool] = None):
+    with metrics.span("signals"):
+        sigs = signals.compute(payload.answers)
+    result = await llm_decider.decide(payload.answers, sigs, mode="lighting", refine=refine)
     intake = Intake(mode="lighting", answers=payload.answers, signals=sigs,
                     stacks=result["stacks"], biases=result["biases"])
-    session.add(intake); session.commit()
-    return {"stacks": result["stacks"], "biases": result["biases"]}
+    await run_in_threadpool(save, intake)
+    return {"stacks": result["stacks"], "biases": result["biases"], "fallback": result["fallback"],
+            "kbVersion": result["kbVersion"], "source": result["source"]}
 
 @router.post("/deep-dive")
-def intake_deep_dive(payload: DeepDivePayload, session: Session = Depends(get_session)):
-    init_db()
-    sigs = signals.compute(payload.answers)
-    result = llm_decider.decide(payload.answers, sigs, mode="deep_dive")
+async def intake_deep_dive(payload: DeepDivePayload, refine: Optional[bool] = None):
+    with metrics.span("signals"):
+        sigs = signals.compute(payload.answers)
+    result = await llm_decider.decide(payload.answers, sigs, mode="deep_dive", refine=refine)
     intake = Intake(mode="deep_dive", answers=payload.answers, signals=sigs,
                     stacks=result["stacks"], biases=result["biases"])
-    session.add(intake); session.commit(); session.refresh(intake)
-    return {"intake_id": intake.id, "stacks": result["stacks"], "biases": result["biases"]}
+    await run_in_threadpool(save, intake)
+    return {"intake_id": intake.id, "stacks": result["stacks"], "biases": result["biases"],
+            "fallback": result["fallback"], "kbVersion": result["kbVersion"], "source": result["source"]}
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _decision_events(answers: dict, mode: str, refine: Optional[bool]):
+    with metrics.span("signals"):
+        sigs = signals.compute(answers)
+    yield _sse("signals", sigs)
+    try:
+        async for event, data in llm_decider.decide_stream(answers, sigs, mode=mode, refine=refine):
+            if event == "done":
+                intake = Intake(mode=mode, answers=answers, signals=sigs,
+                                stacks=data["stacks"], biases=data["biases"])
+                await run_in_threadpool(save, intake)
+                if mode == "deep_dive":
+                    data = {"intake_id": intake.id, **data}
+            yield _sse(event, data)
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+
+def _sse_response(answers: dict, mode: str, refine: Optional[bool]) -> StreamingResponse:
+    return StreamingResponse(_decision_events(answers, mode, refine), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/lighting/stream")
+async def intake_lighting_stream(payload: LightingPayload, refine: Optional[bool] = None):
+    """SSE: `signals` first, then one `stack`/`bias` event per element as it is decided, then `done`."""
+    return _sse_response(payload.answers, "lighting", refine)
+
+@router.post("/deep-dive/stream")
+async def intake_deep_dive_stream(payload: DeepDivePayload, refine: Optional[bool] = None):
+    return _sse_response(payload.answers, "deep_dive", refine)
+
+class BatchItem(BaseModel):
+    mode: Literal["lighting", "deep_dive"] = "lighting"
+    answers: Dict[str, Any]
+    ref: Optional[str] = Field(None, description="caller's listing id, echoed back")
+
+class BatchPayload(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+def _ndjson(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+async def _batch_lines(items: List[BatchItem], refine: Optional[bool]):
+    sigs: List[Optional[dict]] = [None] * len(items)
+    groups: Dict[str, List[int]] = {}
+    for i, it in enumerate(items):
+        try:
+            with metrics.span("signals"):
+                sigs[i] = signals.compute(it.answers)
+        except Exception as e:
+            yield _ndjson({"index": i, "ref": it.ref, "ok": False, "error": f"{type(e).__name__}: {e}"})
+            continue
+        # identical answers in the same mode share one decision
+        groups.setdefault(canonical_key(it.mode, it.answers), []).append(i)
+
+    sem = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def run(idxs: List[int]):
+        first = items[idxs[0]]
+        async with sem:
+            try:
+                return idxs, await llm_decider.decide(first.answers, sigs[idxs[0]], mode=first.mode,
+                                                       refine=refine), None
+            except Exception as e:
+                return idxs, None, e
+
+    tasks = [asyncio.create_task(run(idxs)) for idxs in groups.values()]
+    saved = 0
+    try:
+        for fut in asyncio.as_completed(tasks):
+            idxs, result, err = await fut
+            rows = []
+            if err is None:
+                rows = [Intake(mode=items[i].mode, answers=items[i].answers, signals=sigs[i],
+                               stacks=result["stacks"], biases=result["biases"]) for i in idxs]
+                # one transaction per group, committed before any of its lines report ok
+                try:
+                    await run_in_threadpool(save, *rows)
+                except Exception as e:
+                    err = e
+            for i, intake in zip(idxs, rows if err is None else [None] * len(idxs)):
+                it = items[i]
+                if err is not None:
+                    yield _ndjson({"index": i, "ref": it.ref, "ok": False, "error": f"{type(err).__name__}: {err}"})
+                    continue
+                yield _ndjson({"index": i, "ref": it.ref, "ok": True, "intake_id": intake.id, "mode": it.mode,
+                               "stacks": result["stacks"], "biases": result["biases"], "fallback": result["fallback"],
+                               "kbVersion": result["kbVersion"], "source": result["source"]})
+            if err is None:
+                saved += len(rows)
+    finally:
+        for t in tasks:
+            t.cancel()
+    yield _ndjson({"summary": True, "total": len(items), "ok": saved, "errors": len(items) - saved,
+                   "unique": len(groups)})
+
+@router.post("/batch")
+async def intake_batch(payload: BatchPayload, refine: Optional[bool] = None):
+    """NDJSON, one line per item in completion order, then a summary line. Items that share a
+    decision are saved together, and their lines are sent only once that commit succeeded."""
+    return StreamingResponse(_batch_lines(payload.items, refine), media_type="application/x-ndjson")
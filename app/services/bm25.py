@@ -0,0 +1,63 @@
+import math, re
+import numpy as np
+from typing import List, Dict, Any, Tuple, Iterable
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+class BM25Index:
+    """Inverted index with BM25 weights precomputed per posting.
+
+    Each posting list is a pair of (doc_ids int32, idf * saturated-tf float32) arrays, so a
+    query is one bincount over the postings of its terms plus an argpartition for top-n.
+    """
+
+    def __init__(self, docs: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        toks = [tokenize(d) for d in docs]
+        self.n_docs = len(toks)
+        avgdl = (sum(len(t) for t in toks) / self.n_docs) if self.n_docs else 0.0
+        tfs: Dict[str, Dict[int, int]] = {}
+        for i, t in enumerate(toks):
+            for w in t:
+                d = tfs.setdefault(w, {})
+                d[i] = d.get(i, 0) + 1
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for w, d in tfs.items():
+            idf = math.log(1.0 + (self.n_docs - len(d) + 0.5) / (len(d) + 0.5))
+            ids = np.fromiter(d.keys(), dtype=np.int32, count=len(d))
+            tf = np.fromiter(d.values(), dtype=np.float32, count=len(d))
+            dl = np.fromiter((len(toks[i]) for i in d), dtype=np.float32, count=len(d))
+            norm = k1 * (1.0 - b + b * dl / (avgdl or 1.0))
+            self.postings[w] = (ids, (idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+
+    def scores(self, query: str) -> np.ndarray:
+        qtf: Dict[str, int] = {}
+        for w in tokenize(query):
+            if w in self.postings:
+                qtf[w] = qtf.get(w, 0) + 1
+        if not qtf:
+            return np.zeros(self.n_docs, dtype=np.float32)
+        ids = np.concatenate([self.postings[w][0] for w in qtf])
+        wts = np.concatenate([self.postings[w][1] * c for w, c in qtf.items()])
+        return np.bincount(ids, weights=wts, minlength=self.n_docs)
+
+    def top(self, query: str, n: int) -> List[Tuple[int, float]]:
+        """Top-n (doc_id, score), best first. Unmatched docs score 0 and still fill the
+        list, like the old full-sort scan did."""
+        if self.n_docs == 0 or n <= 0:
+            return []
+        sc = self.scores(query)
+        cand = np.arange(self.n_docs) if n >= self.n_docs else np.argpartition(-sc, n - 1)[:n]
+        order = cand[np.lexsort((cand, -sc[cand]))]
+        return [(int(i), float(sc[i])) for i in order]
+
+def service_text(s: Dict[str, Any]) -> str:
+    return s.get("name", "") + " " + " ".join(s.get("deliverables", []))
+
+def bias_text(b: Dict[str, Any]) -> str:
+    return b.get("name", "") + " " + b.get("definition", "") + " " + " ".join(b.get("copy_patterns", []))
+
+def query_text(intake_facts: Dict[str, Any]) -> str:
+    return " ".join([f"{k}:{v}" for k, v in intake_facts.items() if isinstance(v, (str, int, float))])
@@ -0,0 +1,180 @@
+import asyncio, hashlib, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from typing import Any, Awaitable, Callable, Optional, Dict
+from app.services import metrics
+
+def _normalize(v: Any) -> Any:
+    if isinstance(v, str):
+        return " ".join(v.split())
+    if isinstance(v, dict):
+        return {str(k): _normalize(x) for k, x in v.items() if x is not None}
+    if isinstance(v, (list, tuple)):
+        return [_normalize(x) for x in v]
+    return v
+
+def canonical_key(*parts: Any) -> str:
+    """Stable sha256 over whitespace-normalised, key-sorted JSON of parts."""
+    blob = json.dumps([_normalize(p) for p in parts], sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class TTLCache:
+    """In-process LRU with per-entry TTL, optionally backed by a SQLite tier that survives restarts.
+
+    Values must be JSON-serialisable when a path is given. get/set do the disk tier inline;
+    async code uses aget/aset, which run it in a worker thread so the event loop never blocks.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl_s: float = 3600.0, path: Optional[str] = None):
+        self.name, self.maxsize, self.ttl_s, self.path = name, maxsize, ttl_s, path
+        self._mem: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = 0
+        self._sets = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._db() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS cache (name TEXT NOT NULL, key TEXT NOT NULL, "
+                             "value TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (name, key))")
+
+    @contextmanager
+    def _db(self):
+        # one short-lived connection per call: commits on success, always closed
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn, conn:
+            yield conn
+
+    _MISS = object()
+
+    def _mem_get(self, key: str, now: float) -> Any:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return hit[1]
+                del self._mem[key]
+        return self._MISS
+
+    def _disk_get(self, key: str, now: float) -> Optional[Any]:
+        if self.path:
+            with self._db() as conn:
+                row = conn.execute("SELECT value, expires_at FROM cache WHERE name = ? AND key = ?",
+                                   (self.name, key)).fetchone()
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._put(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        value = self._mem_get(key, now)
+        return self._disk_get(key, now) if value is self._MISS else value
+
+    async def aget(self, key: str) -> Optional[Any]:
+        now = time.time()
+        value = self._mem_get(key, now)
+        if value is not self._MISS:
+            return value
+        if not self.path:
+            return self._disk_get(key, now)
+        return await asyncio.to_thread(self._disk_get, key, now)
+
+    def _put(self, key: str, value: Any, expires_at: float):
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def _mem_set(self, key: str, value: Any) -> tuple:
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._put(key, value, expires_at)
+            self._sets += 1
+            return expires_at, self._sets % 256 == 0
+
+    def _disk_set(self, key: str, value: Any, expires_at: float, purge: bool):
+        if self.path:
+            with self._db() as conn:
+                conn.execute("INSERT OR REPLACE INTO cache (name, key, value, expires_at) VALUES (?,?,?,?)",
+                             (self.name, key, json.dumps(value, ensure_ascii=False), expires_at))
+                if purge:
+                    conn.execute("DELETE FROM cache WHERE name = ? AND expires_at <= ?", (self.name, time.time()))
+
+    def set(self, key: str, value: Any):
+        self._disk_set(key, value, *self._mem_set(key, value))
+
+    async def aset(self, key: str, value: Any):
+        expires_at, purge = self._mem_set(key, value)
+        if self.path:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at, purge)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self.path:
+            with self._db() as conn:
+                conn.execute("DELETE FROM cache WHERE name = ?", (self.name,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._mem), "hits": self.hits, "misses": self.misses,
+                    "diskHits": self.disk_hits, "persistent": bool(self.path)}
+
+class SingleFlight:
+    """Coalesce concurrent identical async calls: callers of do() with the same key while a call
+    is in flight await that one call and share its result or its exception.
+
+    The key is forgotten as soon as the call settles, so a failure is never replayed to later
+    callers. The call runs as its own task: one caller being cancelled doesn't cancel it for the rest.
+    Counts and current in-flight/waiter totals are exported through metrics, labelled by name.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, "asyncio.Task"] = {}
+        self._waiters: Dict[str, int] = {}
+        self.calls = self.shared = self.errors = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            metrics.inc("singleflight_calls_total", flight=self.name)
+            task = asyncio.ensure_future(fn())
+            self._inflight[key], self._waiters[key] = task, 0
+            task.add_done_callback(lambda t: self._settle(key, t))
+        else:
+            self.shared += 1
+            metrics.inc("singleflight_shared_total", flight=self.name)
+        self._waiters[key] += 1
+        self._publish()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if key in self._waiters and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                self._publish()
+
+    def _settle(self, key: str, task: "asyncio.Task"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key], self._waiters[key]
+            self._publish()
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            metrics.inc("singleflight_errors_total", flight=self.name)
+
+    def _publish(self):
+        metrics.gauge("singleflight_inflight", len(self._inflight), flight=self.name)
+        metrics.gauge("singleflight_waiters", sum(self._waiters.values()), flight=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"inflight": len(self._inflight), "calls": self.calls, "shared": self.shared,
+                "errors": self.errors, "waiters": {k[:12]: n for k, n in self._waiters.items()}}
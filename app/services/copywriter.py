@@ -1,5 +1,13 @@
+import asyncio, copy, logging
 from app.config import settings
-from app.services.kb_store import retrieve_context
+from app.services import llm_client, metrics, prompts
+from app.services.cache import SingleFlight, canonical_key
+from app.services.hedging import LatencyTracker, hedged
+from app.services.kb_store import aretrieve_context, get_snapshot
+
+log = logging.getLogger(__name__)
+latency = LatencyTracker(name="copy")
+inflight = SingleFlight("copy")
 
 def _offline_pack():
     return {
@@ -29,29 +37,42 @@ def _offline_pack():
         "disclaimers":{"schools_safety":"School and safety references must remain factual only—use names, distances, links.","post_production":"Post-production limited to non-material item removals and sky/grass adjustments."}
     }
 
-def _call_llm(intake, chosen_stack, chosen_bias, kb_context):
+async def _call_llm(intake, chosen_stack, chosen_bias, kb_context, tag=""):
     if not settings.OPENAI_API_KEY:
         return _offline_pack()
-    from openai import OpenAI
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
     sys = ("You write neutral, factual, bias-aware listing content. "
            "Compliance: schools/safety factual only. Post-production limited. Return JSON.")
-    prompt = {"intake": intake, "chosen_stack": chosen_stack, "chosen_bias": chosen_bias, "kb_context": kb_context}
-    resp = client.chat.completions.create(
-        model=settings.OPENAI_MODEL,
-        response_format={"type":"json_object"},
-        temperature=0.3,
-        messages=[{"role":"system","content":sys},{"role":"user","content":str(prompt)}]
-    )
-    import json
-    return json.loads(resp.choices[0].message.content)
+    prompt = {"intake": intake, "chosen_stack": prompts.stack(chosen_stack), "chosen_bias": chosen_bias,
+              "kb_context": prompts.context(kb_context)}
+    return await llm_client.chat_json(sys, prompts.dumps(prompt), temperature=0.3, label="copy", tag=tag)
 
-def generate(intake, chosen_tier, chosen_bias):
+@metrics.timed("copy")
+async def generate(intake, chosen_tier, chosen_bias, budget_s=None):
+    """Copy pack for the chosen tier/bias. If the LLM misses the budget or fails, the offline
+    pack is returned with "fallback": True so callers can avoid caching it. Concurrent calls
+    for the same intake, tier, bias and KB version share one generation; each gets its own copy."""
     stacks = intake.stacks
     chosen_stack = next(s for s in stacks if s["tier"].lower()==chosen_tier.lower())
-    kb = retrieve_context(intake.answers, k=6)
     bias = next((b for b in intake.biases if b["key"]==chosen_bias), intake.biases[0])
-    pack = _call_llm(intake={"answers":intake.answers,"signals":intake.signals}, chosen_stack=chosen_stack, chosen_bias=bias, kb_context=kb)
+    budget_s = budget_s or settings.LLM_BUDGET_COPY_S
+    key = canonical_key(intake.answers, intake.signals, chosen_stack, bias, settings.OPENAI_MODEL,
+                        get_snapshot().version)
+    pack = await inflight.do(key, lambda: _generate(intake, chosen_stack, bias, budget_s))
+    return copy.deepcopy(pack)
+
+async def _generate(intake, chosen_stack, bias, budget_s):
+    kb = await aretrieve_context(intake.answers, k=6)
+    async def call():
+        return await _call_llm(intake={"answers":intake.answers,"signals":intake.signals},
+                               chosen_stack=chosen_stack, chosen_bias=bias, kb_context=kb,
+                               tag=str(getattr(intake, "id", "") or ""))
+    try:
+        pack = await hedged(call, budget_s, latency)
+    except Exception as e:
+        reason = f"LLM budget of {budget_s:.1f}s exceeded" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+        log.warning("copywriter fell back to offline pack: %s", reason)
+        metrics.inc("fallbacks_total", call="copy")
+        pack = dict(_offline_pack(), fallback=True)
     pack.setdefault("disclaimers",{})
     pack["disclaimers"].setdefault("schools_safety","School and safety references must remain factual only—use names, distances, and links.")
     pack["disclaimers"].setdefault("post_production","Post-production limited to non-material item removals and sky/grass adjustments.")
@@ -0,0 +1,108 @@
+import hashlib, os, sqlite3
+from contextlib import closing
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from app.config import settings
+from app.services.bm25 import tokenize
+
+HASH_DIM = 512
+EMBED_BATCH = 512  # documents per embeddings request (the API caps inputs per call at 2048)
+
+def hash_embed(texts: List[str], dim: int = HASH_DIM) -> np.ndarray:
+    """Deterministic offline embedder: signed feature hashing of unigrams + bigrams, L2-normalised."""
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        toks = tokenize(text)
+        for feat in toks + [a + "_" + b for a, b in zip(toks, toks[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feat.encode(), digest_size=8).digest(), "little")
+            out[row, h % dim] += 1.0 if (h >> 63) & 1 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+def _openai_embed(texts: List[str]) -> np.ndarray:
+    from app.services.llm_client import get_sync_client
+    rows = []
+    for i in range(0, len(texts), EMBED_BATCH):
+        resp = get_sync_client().embeddings.create(model=settings.OPENAI_EMBED_MODEL,
+                                                   input=texts[i:i + EMBED_BATCH])
+        rows += [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+    m = np.asarray(rows, dtype=np.float32)
+    return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+
+def embedder_name() -> str:
+    if settings.KB_EMBEDDER == "openai" and settings.OPENAI_API_KEY:
+        return settings.OPENAI_EMBED_MODEL
+    return f"hash-{HASH_DIM}"
+
+def remote() -> bool:
+    """Whether embed() is a network call (blocking: keep it off the event loop)."""
+    return embedder_name() == settings.OPENAI_EMBED_MODEL
+
+def embed(texts: List[str]) -> np.ndarray:
+    if not texts:
+        return np.zeros((0, HASH_DIM), dtype=np.float32)
+    if remote():
+        return _openai_embed(texts)
+    return hash_embed(texts)
+
+def _content_hash(model: str, text: str) -> str:
+    return hashlib.sha1((model + "\x00" + text).encode("utf-8")).hexdigest()
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or settings.KB_SQLITE_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                 "doc_key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, model TEXT NOT NULL, "
+                 "dim INTEGER NOT NULL, vec BLOB NOT NULL)")
+    return conn
+
+def sync(docs: Dict[str, str], path: Optional[str] = None) -> int:
+    """Store one vector per doc_key -> text. Only new or changed docs are embedded; rows for
+    docs that no longer exist are dropped. Returns the number of docs (re-)embedded."""
+    model = embedder_name()
+    want = {k: _content_hash(model, t) for k, t in docs.items()}
+    with closing(_connect(path)) as conn, conn:
+        have = dict(conn.execute("SELECT doc_key, content_hash FROM embeddings"))
+        stale = [k for k in have if k not in want]
+        todo = [k for k, h in want.items() if have.get(k) != h]
+        if stale:
+            conn.executemany("DELETE FROM embeddings WHERE doc_key = ?", [(k,) for k in stale])
+        if todo:
+            vecs = embed([docs[k] for k in todo])
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (doc_key, content_hash, model, dim, vec) VALUES (?,?,?,?,?)",
+                [(k, want[k], model, vecs.shape[1], vecs[i].astype(np.float32).tobytes())
+                 for i, k in enumerate(todo)])
+    return len(todo)
+
+def load_matrix(docs: Dict[str, str], path: Optional[str] = None) -> Optional[np.ndarray]:
+    """Contiguous float32 matrix with one row per doc_key (in dict order), or None if any
+    doc is missing or stale in the store (i.e. build_or_refresh hasn't embedded it yet)."""
+    path = path or settings.KB_SQLITE_PATH
+    if not docs or not os.path.exists(path):
+        return None
+    model = embedder_name()
+    with closing(_connect(path)) as conn:
+        rows: Dict[str, Tuple[str, int, bytes]] = {
+            k: (h, d, v) for k, h, d, v in conn.execute("SELECT doc_key, content_hash, dim, vec FROM embeddings")}
+    first = next(iter(rows.values()), None)
+    if first is None:
+        return None
+    mat = np.empty((len(docs), first[1]), dtype=np.float32)
+    for i, (k, text) in enumerate(docs.items()):
+        row = rows.get(k)
+        if row is None or row[0] != _content_hash(model, text) or row[1] != mat.shape[1]:
+            return None
+        mat[i] = np.frombuffer(row[2], dtype=np.float32)
+    return mat
+
+def top(matrix: np.ndarray, qvec: np.ndarray, n: int) -> List[Tuple[int, float]]:
+    sc = matrix @ qvec
+    if n >= len(sc):
+        cand = np.arange(len(sc))
+    else:
+        cand = np.argpartition(-sc, n - 1)[:n]
+    order = cand[np.argsort(-sc[cand], kind="stable")]
+    return [(int(i), float(sc[i])) for i in order]
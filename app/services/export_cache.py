@@ -0,0 +1,53 @@
+import json, os
+from typing import Any, Dict, Optional, Tuple
+from app.config import settings
+from app.models import Intake
+from app.services import kb_store
+from app.services.cache import canonical_key
+
+def export_key(intake: Intake, chosen_tier: str, chosen_bias: str) -> str:
+    """Content address of an export: same intake content, choices, model and KB -> same files."""
+    content = {"mode": intake.mode, "answers": intake.answers, "signals": intake.signals,
+               "stacks": intake.stacks, "biases": intake.biases}
+    return canonical_key(content, chosen_tier.lower(), chosen_bias, settings.OPENAI_MODEL,
+                         kb_store.get_snapshot().version)[:32]
+
+def docx_name(key: str, intake_id: str) -> str:
+    # the copy pack is shared by identical intakes; the .docx prints the intake id, so it isn't
+    return f"{key}_{intake_id}"
+
+def paths(key: str, intake_id: str = "") -> Tuple[str, str]:
+    return (os.path.join(settings.EXPORT_DIR, f"{key}.pack.json"),
+            os.path.join(settings.EXPORT_DIR, f"{docx_name(key, intake_id)}.docx"))
+
+def load_pack(key: str) -> Optional[Dict[str, Any]]:
+    pack_path, _ = paths(key)
+    try:
+        with open(pack_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def save_pack(key: str, pack: Dict[str, Any]):
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    pack_path, _ = paths(key)
+    tmp = f"{pack_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(pack, f, ensure_ascii=False)
+    os.replace(tmp, pack_path)
+
+def save_docx(name: str, data: bytes) -> str:
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.EXPORT_DIR, f"{name}.docx")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+def lookup(key: str, intake_id: str) -> Optional[str]:
+    """Path of the finished .docx if both it and its copy pack exist."""
+    pack_path, docx_path = paths(key, intake_id)
+    if os.path.exists(pack_path) and os.path.exists(docx_path):
+        return docx_path
+    return None
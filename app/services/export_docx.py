@@ -1,89 +1,146 @@
 from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt
 from app.config import settings
 from app.models import Intake
-import os
-from typing import Dict, Any
+import io, os, threading
+from typing import Dict, Any, Optional, List, Tuple
 
-def _h(doc, text, lvl=1): doc.add_heading(text, level=lvl)
-def _p(doc, text): doc.add_paragraph(text)
-def _bullets(doc, items):
-    for it in items: doc.add_paragraph(it, style="List Bullet")
+# (style_id, text) pairs; style_id None means a Normal paragraph
+Para = Tuple[Optional[str], str]
 
-def build_doc(intake: Intake, copy_pack: Dict[str,Any], chosen_tier: str, chosen_bias: str, job_id: str) -> str:
-    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
-    doc = Document()
-    _h(doc, "Proposal + Listing Lingo Pack", 0)
-    _p(doc, f"Mode: Deep Dive | Intake ID: {intake.id}")
-    _p(doc, f"Chosen Tier: {chosen_tier} | Bias Plan: {chosen_bias}")
-    _h(doc, "Chosen Services & Why", 1)
-    stack = next(s for s in intake.stacks if s["tier"].lower()==chosen_tier.lower())
-    for s in stack["services"]:
-        _h(doc, s["name"], 2)
-        _p(doc, s.get("rationale",""))
+_HEADING = {0: "Title", 1: "Heading1", 2: "Heading2", 3: "Heading3", 4: "Heading4"}
+_BULLET = "ListBullet"
+_DEFAULT_CADENCE = {"Phase I": ["Morning 9–11a","Lunch 12–2p","Evening 5–8p"],
+                    "Phase II": ["Morning 9–11a","Lunch 12–2p","Evening 5–8p"]}
+
+# Declarative layout of the copy pack: one entry per top-level section.
+#   max_level: deepest heading level a nested dict may open; anything deeper is printed as text
+#   scalar:    how a non-list leaf is written ("para" or "bullet")
+#   title_keys: prettify snake_case keys for headings
+LAYOUT: List[Dict[str, Any]] = [
+    {"key": "core_listing_print", "title": "I. Core Listing & Print", "max_level": 4},
+    {"key": "digital_social", "title": "II. Digital & Social", "max_level": 3},
+    {"key": "direct_outreach", "title": "III. Direct Outreach", "max_level": 3},
+    {"key": "cadence", "title": "Phase I/II & Week-1 Cadence", "max_level": 2, "default": _DEFAULT_CADENCE},
+    {"key": "ops_checklists", "title": "Operational Checklists", "max_level": 2, "scalar": "bullet"},
+    {"key": "kpis", "title": "KPIs (Simple)",
+     "default": ["CTR on listing page", "Video completion rate", "Inquiry response time"]},
+    {"key": "disclaimers", "title": "Disclaimers", "max_level": 2, "title_keys": True},
+]
+
+def _render_node(out: List[Para], node: Any, level: int, spec: Dict[str, Any]):
+    if isinstance(node, list):
+        out.extend((_BULLET, str(it)) for it in node)
+    elif isinstance(node, dict) and level <= spec.get("max_level", 1):
+        for k, v in node.items():
+            out.append((_HEADING[level], k.replace("_", " ").title() if spec.get("title_keys") else k))
+            _render_node(out, v, level + 1, spec)
+    else:
+        out.append((_BULLET if spec.get("scalar") == "bullet" else None, str(node)))
 
-    _h(doc, "I. Core Listing & Print", 1)
-    cp = copy_pack.get("core_listing_print", {})
-    for k,v in cp.items():
-        _h(doc, k, 2)
-        if isinstance(v, list): _bullets(doc, v)
-        elif isinstance(v, dict):
-            for sk,sv in v.items():
-                _h(doc, sk, 3)
-                if isinstance(sv, list): _bullets(doc, sv)
-                elif isinstance(sv, dict):
-                    for ssk, ssv in sv.items():
-                        _h(doc, ssk, 4)
-                        if isinstance(ssv, list): _bullets(doc, ssv)
-                        else: _p(doc, str(ssv))
-                else: _p(doc, str(sv))
-        else: _p(doc, str(v))
+def pack_paragraphs(copy_pack: Dict[str, Any]) -> List[Para]:
+    out: List[Para] = []
+    for spec in LAYOUT:
+        out.append((_HEADING[1], spec["title"]))
+        _render_node(out, copy_pack.get(spec["key"], spec.get("default", {})), 2, spec)
+    return out
 
-    _h(doc, "II. Digital & Social", 1)
-    ds = copy_pack.get("digital_social", {})
-    for k,v in ds.items():
-        _h(doc, k, 2)
-        if isinstance(v, list): _bullets(doc, v)
-        elif isinstance(v, dict):
-            for sk,sv in v.items():
-                _h(doc, sk, 3)
-                if isinstance(sv, list): _bullets(doc, sv)
-                else: _p(doc, str(sv))
-        else: _p(doc, str(v))
+def _styled_base() -> bytes:
+    if settings.DOCX_TEMPLATE_PATH and os.path.exists(settings.DOCX_TEMPLATE_PATH):
+        with open(settings.DOCX_TEMPLATE_PATH, "rb") as f:
+            return f.read()
+    doc = Document()
+    normal = doc.styles["Normal"]
+    normal.font.name = "Calibri"
+    normal.font.size = Pt(11)
+    normal.paragraph_format.space_after = Pt(4)
+    bio = io.BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
 
-    _h(doc, "III. Direct Outreach", 1)
-    do = copy_pack.get("direct_outreach", {})
-    for k,v in do.items():
-        _h(doc, k, 2)
-        if isinstance(v, list): _bullets(doc, v)
-        elif isinstance(v, dict):
-            for sk,sv in v.items():
-                _h(doc, sk, 3)
-                if isinstance(sv, list): _bullets(doc, sv)
-                else: _p(doc, str(sv))
-        else: _p(doc, str(v))
+_base: Optional[bytes] = None
+_base_lock = threading.Lock()
 
-    _h(doc, "Phase I/II & Week-1 Cadence", 1)
-    cadence = copy_pack.get("cadence", {"Phase I": ["Morning 9–11a","Lunch 12–2p","Evening 5–8p"],
-                                        "Phase II": ["Morning 9–11a","Lunch 12–2p","Evening 5–8p"]})
-    for k,v in cadence.items():
-        _h(doc, k, 2); _bullets(doc, v)
+def _base_template() -> bytes:
+    """Pre-styled base document, serialised once per process and cloned for every export."""
+    global _base
+    if _base is None:
+        with _base_lock:
+            if _base is None:
+                _base = _styled_base()
+    return _base
 
-    _h(doc, "Operational Checklists", 1)
-    ops = copy_pack.get("ops_checklists", {})
-    for k,v in ops.items():
-        _h(doc, k, 2)
-        _bullets(doc, v if isinstance(v,list) else [str(v)])
+def _make_p(style_id: Optional[str], text: str):
+    p = OxmlElement("w:p")
+    if style_id:
+        ppr = OxmlElement("w:pPr")
+        ps = OxmlElement("w:pStyle")
+        ps.set(qn("w:val"), style_id)
+        ppr.append(ps)
+        p.append(ppr)
+    # one run, written the way python-docx's run.text does: "\n" -> w:br, "\t" -> w:tab
+    r = OxmlElement("w:r")
+    for i, line in enumerate(text.split("\n")):
+        if i:
+            r.append(OxmlElement("w:br"))
+        for j, chunk in enumerate(line.split("\t")):
+            if j:
+                r.append(OxmlElement("w:tab"))
+            if chunk:
+                t = OxmlElement("w:t")
+                t.set("{http://www.w3.org/XML/1998/namespace}space", "preserve")
+                t.text = chunk
+                r.append(t)
+    if len(r):
+        p.append(r)
+    return p
 
-    _h(doc, "KPIs (Simple)", 1)
-    kpis = copy_pack.get("kpis", ["CTR on listing page", "Video completion rate", "Inquiry response time"])
-    _bullets(doc, kpis)
+def render(paragraphs: List[Para]) -> Document:
+    """Clone the base template and append all paragraphs as raw w:p elements in one pass."""
+    doc = Document(io.BytesIO(_base_template()))
+    body = doc.element.body
+    sect = body.find(qn("w:sectPr"))
+    at = body.index(sect) if sect is not None else len(body)
+    body[at:at] = [_make_p(s, t) for s, t in paragraphs]
+    return doc
 
-    _h(doc, "Disclaimers", 1)
-    disc = copy_pack.get("disclaimers", {})
-    for k,v in disc.items():
-        _h(doc, k.replace("_"," ").title(), 2)
-        _p(doc, v)
+def proposal_paragraphs(intake: Intake, copy_pack: Dict[str,Any], chosen_tier: str, chosen_bias: str) -> List[Para]:
+    stack = next(s for s in intake.stacks if s["tier"].lower()==chosen_tier.lower())
+    out: List[Para] = [
+        (_HEADING[0], "Proposal + Listing Lingo Pack"),
+        (None, f"Mode: Deep Dive | Intake ID: {intake.id}"),
+        (None, f"Chosen Tier: {chosen_tier} | Bias Plan: {chosen_bias}"),
+        (_HEADING[1], "Chosen Services & Why"),
+    ]
+    for s in stack["services"]:
+        out += [(_HEADING[2], s["name"]), (None, s.get("rationale",""))]
+        if s.get("list_price") is not None:
+            out.append((None, f"List price: ${s['list_price']:,.2f}" + (f" (SKU {s['sku']})" if s.get("sku") else "")))
+    if stack.get("total") is not None:
+        out.append((None, f"Stack total: ${stack['total']:,.2f}"))
+    return out + pack_paragraphs(copy_pack)
 
-    outpath = os.path.join(settings.EXPORT_DIR, f"{job_id}.docx")
-    doc.save(outpath)
+def build_doc(intake: Intake, copy_pack: Dict[str,Any], chosen_tier: str, chosen_bias: str, job_id: str,
+              name: Optional[str] = None) -> str:
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    doc = render(proposal_paragraphs(intake, copy_pack, chosen_tier, chosen_bias))
+    outpath = os.path.join(settings.EXPORT_DIR, f"{name or job_id}.docx")
+    # write-then-rename so a concurrent download never sees a half-written file
+    tmp = f"{outpath}.{job_id}.tmp"
+    doc.save(tmp)
+    os.replace(tmp, outpath)
     return outpath
+
+def render_bytes(intake_data: Dict[str,Any], copy_pack: Dict[str,Any], chosen_tier: str, chosen_bias: str) -> bytes:
+    """In-memory .docx for direct responses; process-pool friendly like render_job."""
+    doc = render(proposal_paragraphs(Intake(**intake_data), copy_pack, chosen_tier, chosen_bias))
+    bio = io.BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
+
+def render_job(intake_data: Dict[str,Any], copy_pack: Dict[str,Any], chosen_tier: str, chosen_bias: str,
+               job_id: str, name: Optional[str] = None) -> str:
+    """Process-pool entry point; takes plain data so arguments pickle cheaply."""
+    return build_doc(Intake(**intake_data), copy_pack, chosen_tier, chosen_bias, job_id, name)
@@ -0,0 +1,148 @@
+import asyncio, logging, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from app.config import settings
+from app.deps import engine
+from app.models import Intake, ExportJob
+from app.services import copywriter, export_docx, export_cache, metrics
+
+log = logging.getLogger(__name__)
+
+def _set_status(job_id: str, status: str, **fields):
+    with Session(engine) as session:
+        session.exec(update(ExportJob).where(ExportJob.id == job_id)
+                     .values(status=status, updated_at=datetime.utcnow(), **fields))
+        session.commit()
+
+def _claim(job_id: str) -> bool:
+    # pending -> running in one conditional UPDATE, so only one worker/process runs a job
+    with Session(engine) as session:
+        res = session.exec(update(ExportJob)
+                           .where(ExportJob.id == job_id, ExportJob.status == "pending")
+                           .values(status="running", updated_at=datetime.utcnow()))
+        session.commit()
+        return res.rowcount == 1
+
+class ExportQueue:
+    """Bounded in-process queue: EXPORT_WORKERS tasks run the copy-pack LLM step and hand
+    the python-docx render to a ProcessPoolExecutor."""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=settings.EXPORT_QUEUE_MAX)
+        if settings.EXPORT_RENDER_PROCESSES > 0:
+            # spawn, not fork: forking a process that runs an event loop and worker threads can
+            # copy held locks into the children
+            self._pool = ProcessPoolExecutor(max_workers=settings.EXPORT_RENDER_PROCESSES,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.EXPORT_WORKERS)]
+        recovered = await asyncio.to_thread(self._recover)
+        if recovered:
+            # fed as workers free up slots, so a backlog larger than the queue isn't dropped
+            self._workers.append(asyncio.create_task(self._feed(recovered)))
+
+    async def stop(self):
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers, self._queue = [], None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _recover(self) -> List[str]:
+        stale = datetime.utcnow() - timedelta(seconds=settings.EXPORT_JOB_STALE_S)
+        with Session(engine) as session:
+            session.exec(update(ExportJob)
+                         .where(ExportJob.status == "running",
+                                or_(ExportJob.updated_at == None, ExportJob.updated_at < stale))  # noqa: E711
+                         .values(status="pending"))
+            session.commit()
+            jobs = session.exec(select(ExportJob.id).where(ExportJob.status == "pending")
+                                .order_by(ExportJob.created_at)).all()
+        if jobs:
+            log.info("recovering %d pending export jobs", len(jobs))
+        return list(jobs)
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        """Render process pool; None (default threadpool) when not started or configured to 0."""
+        return self._pool
+
+    async def _feed(self, job_ids: List[str]):
+        for job_id in job_ids:
+            await self._queue.put(job_id)
+
+    def submit(self, job_id: str) -> bool:
+        """Enqueue without blocking; False when the queue is full."""
+        try:
+            self._queue.put_nowait(job_id)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await run_job(job_id, self._pool)
+            except Exception:
+                log.exception("export job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+async def copy_pack_for(intake: Intake, tier: str, bias: str, key: str) -> dict:
+    """Stored copy pack for key, else a fresh one (persisted unless it is an offline fallback)."""
+    copy_pack = export_cache.load_pack(key)
+    if copy_pack is None:
+        copy_pack = await copywriter.generate(intake=intake, chosen_tier=tier, chosen_bias=bias)
+        if not copy_pack.get("fallback"):
+            export_cache.save_pack(key, copy_pack)
+    return copy_pack
+
+async def render_bytes(intake: Intake, copy_pack: dict, tier: str, bias: str) -> bytes:
+    """Render a .docx in memory on the render process pool (threadpool if the queue isn't running)."""
+    loop = asyncio.get_running_loop()
+    with metrics.span("docx_build"):
+        return await loop.run_in_executor(queue.pool, export_docx.render_bytes, intake.model_dump(),
+                                          copy_pack, tier, bias)
+
+def _load(job_id: str):
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        intake = session.get(Intake, job.intake_id)
+        if intake is None:
+            raise LookupError(f"intake {job.intake_id} not found")
+        key = job.export_key or export_cache.export_key(intake, job.chosen_tier, job.chosen_bias_key)
+        return intake, job.chosen_tier, job.chosen_bias_key, key
+
+async def run_job(job_id: str, pool: Optional[ProcessPoolExecutor] = None):
+    # DB calls go through worker threads: a commit waiting on the SQLite lock must not stall the loop
+    if not await asyncio.to_thread(_claim, job_id):
+        return
+    try:
+        # the key pinned at submit time: a KB reload since then must not move the output file
+        intake, tier, bias, key = await asyncio.to_thread(_load, job_id)
+        copy_pack = await copy_pack_for(intake, tier, bias, key)
+        loop = asyncio.get_running_loop()
+        # pool=None -> default threadpool; either way the event loop stays free. Timed here, not in
+        # build_doc: spans recorded inside a render process never reach this process's metrics
+        with metrics.span("docx_build"):
+            outpath = await loop.run_in_executor(pool, export_docx.render_job, intake.model_dump(), copy_pack,
+                                                 tier, bias, job_id, export_cache.docx_name(key, intake.id))
+        await asyncio.to_thread(_set_status, job_id, "done", file_path=outpath, error=None)
+    except Exception as e:
+        await asyncio.to_thread(_set_status, job_id, "error", error=f"{type(e).__name__}: {e}"[:500])
+
+queue = ExportQueue()
@@ -0,0 +1,45 @@
+import html
+from typing import List
+from app.services.export_docx import Para, _BULLET, _HEADING
+
+# style_id -> heading depth (Title is 1, Heading1 is 2, ...), same paragraph stream as the .docx
+_DEPTH = {style: level + 1 for level, style in _HEADING.items()}
+
+def to_markdown(paragraphs: List[Para]) -> str:
+    out: List[str] = []
+    prev = None
+    for style, text in paragraphs:
+        if style == _BULLET:
+            out.append(f"- {text}")
+        else:
+            if prev == _BULLET:
+                out.append("")
+            if style in _DEPTH:
+                out += ["#" * _DEPTH[style] + " " + text, ""]
+            else:
+                out += [text.replace("\n", "  \n"), ""]
+        prev = style
+    return "\n".join(out).rstrip() + "\n"
+
+def to_html(paragraphs: List[Para]) -> str:
+    out: List[str] = ['<!doctype html><html><head><meta charset="utf-8"><title>Proposal preview</title>'
+                      "<style>body{font-family:Calibri,Arial,sans-serif;font-size:11pt;max-width:50em;margin:2em auto}"
+                      "p{margin:0 0 4pt}</style></head><body>"]
+    in_list = False
+    for style, text in paragraphs:
+        esc = html.escape(text).replace("\n", "<br>")
+        if style == _BULLET:
+            if not in_list:
+                out.append("<ul>"); in_list = True
+            out.append(f"<li>{esc}</li>")
+            continue
+        if in_list:
+            out.append("</ul>"); in_list = False
+        tag = f"h{_DEPTH[style]}" if style in _DEPTH else "p"
+        out.append(f"<{tag}>{esc}</{tag}>")
+    if in_list:
+        out.append("</ul>")
+    out.append("</body></html>")
+    return "".join(out)
+
+RENDERERS = {"html": (to_html, "text/html; charset=utf-8"), "md": (to_markdown, "text/markdown; charset=utf-8")}
@@ -0,0 +1,76 @@
+import asyncio, threading, time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, TypeVar
+from app.config import settings
+from app.services import metrics
+
+T = TypeVar("T")
+
+class LatencyTracker:
+    """Rolling window of successful call latencies; hedge_after() is its p-quantile."""
+
+    def __init__(self, window: int = 200, name: str = "llm"):
+        self.name = name
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            data = sorted(self._samples)
+        if not data:
+            return 0.0
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def hedge_after(self) -> float:
+        with self._lock:
+            n = len(self._samples)
+        if n < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_AFTER_S
+        return max(settings.LLM_HEDGE_FLOOR_S, self.quantile(settings.LLM_HEDGE_QUANTILE))
+
+async def hedged(call: Callable[[], Awaitable[T]], budget_s: float, tracker: LatencyTracker) -> T:
+    """Run call(); if it hasn't returned by the tracker's p90, race an identical second call.
+
+    A failed first attempt launches the second one immediately (so it doubles as the retry).
+    Returns the first success, raises asyncio.TimeoutError once budget_s is spent, or the last
+    error if both attempts fail. Losing attempts are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + budget_s
+    hedge_at = start + tracker.hedge_after()
+
+    async def timed():
+        t0 = time.perf_counter()
+        out = await call()
+        tracker.observe(time.perf_counter() - t0)
+        return out
+
+    pending: List[asyncio.Task] = [asyncio.create_task(timed())]
+    spare = 1
+    err: BaseException = asyncio.TimeoutError()
+    try:
+        while pending:
+            until = min(deadline, hedge_at) if spare else deadline
+            done, _ = await asyncio.wait(pending, timeout=max(0.0, until - loop.time()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                pending.remove(t)
+                if t.exception() is None:
+                    return t.result()
+                err = t.exception()
+            now = loop.time()
+            if now >= deadline:
+                raise asyncio.TimeoutError()
+            if spare and (now >= hedge_at or not pending):
+                metrics.inc("llm_attempts_total", call=tracker.name, reason="hedge" if pending else "retry")
+                pending.append(asyncio.create_task(timed()))
+                spare = 0
+        raise err
+    finally:
+        for t in pending:
+            t.cancel()
@@ -1,23 +1,97 @@
 from app.config import settings
-import os, json
-from typing import Dict, Any, List
+from app.services import ingest_xlsx, kb_store
+import hashlib, os, json, zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Any, Iterable, Iterator, List, Set, Tuple
 
 try:
     from docx import Document
 except Exception:
     Document = None
 
-def _parse_services_docx(path: str) -> List[Dict[str, Any]]:
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# run children that contribute text, as python-docx's Run.text reads them
+_RUN_CHARS = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+def _docx_paragraphs(path: str) -> Iterator[Tuple[str, bool]]:
+    """(text, is_heading) for each body paragraph via python-docx's object model."""
     if Document is None:
-        return []
-    doc = Document(path)
+        return
+    for p in Document(path).paragraphs:
+        style = p.style.name if p.style else None
+        yield p.text, bool(style and style.lower().startswith("heading"))
+
+def _paragraph_styles(zf: zipfile.ZipFile) -> Tuple[Set[str], Set[str], bool]:
+    """Paragraph styleIds, the heading ones among them, and whether the default style is a heading."""
+    ids: Set[str] = set()
+    headings: Set[str] = set()
+    default_heading = False
+    if "word/styles.xml" not in zf.namelist():
+        return ids, headings, default_heading
+    with zf.open("word/styles.xml") as f:
+        for _, el in ET.iterparse(f):
+            if el.tag != _W + "style":
+                continue
+            if el.get(_W + "type") == "paragraph":
+                sid = el.get(_W + "styleId")
+                name = el.find(_W + "name")
+                label = name.get(_W + "val") if name is not None else None
+                heading = bool(label and label.lower().startswith("heading"))
+                ids.add(sid)
+                if heading:
+                    headings.add(sid)
+                if el.get(_W + "default") in ("1", "true", "on"):
+                    default_heading = heading
+            el.clear()
+    return ids, headings, default_heading
+
+def _run_text(r: ET.Element) -> str:
+    out = []
+    for c in r:
+        if c.tag == _W + "t":
+            out.append(c.text or "")
+        elif c.tag == _W + "br":
+            out.append("\n" if c.get(_W + "type", "textWrapping") == "textWrapping" else "")
+        elif c.tag in _RUN_CHARS:
+            out.append(_RUN_CHARS[c.tag])
+    return "".join(out)
+
+def _stream_paragraphs(path: str) -> Iterator[Tuple[str, bool]]:
+    """Same stream as _docx_paragraphs, iterparsed from word/document.xml without building the
+    object model or touching word/media; each body child is dropped once read."""
+    with zipfile.ZipFile(path) as zf:
+        style_ids, headings, default_heading = _paragraph_styles(zf)
+        with zf.open("word/document.xml") as f:
+            depth, body = 0, None
+            for event, el in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and el.tag == _W + "body":
+                        body = el
+                    continue
+                depth -= 1
+                if depth != 2 or body is None:
+                    continue
+                if el.tag == _W + "p":
+                    parts = []
+                    for c in el:
+                        if c.tag == _W + "r":
+                            parts.append(_run_text(c))
+                        elif c.tag == _W + "hyperlink":
+                            parts += [_run_text(r) for r in c.findall(_W + "r")]
+                    ps = el.find(f"{_W}pPr/{_W}pStyle")
+                    sid = ps.get(_W + "val") if ps is not None else None
+                    yield "".join(parts), (sid in headings) if sid in style_ids else default_heading
+                body.remove(el)
+
+def _services_from(paragraphs: Iterable[Tuple[str, bool]]) -> List[Dict[str, Any]]:
     items = []
     current = {}
-    for p in doc.paragraphs:
-        t = p.text.strip()
+    for text, heading in paragraphs:
+        t = text.strip()
         if not t:
             continue
-        if p.style and p.style.name and p.style.name.lower().startswith("heading"):
+        if heading:
             if current:
                 items.append(current)
             current = {"service_id": t.lower().replace(" ","_"), "name": t, "deliverables": [],
@@ -36,17 +110,14 @@ def _parse_services_docx(path: str) -> List[Dict[str, Any]]:
         items.append(current)
     return items
 
-def _parse_biases_docx(path: str) -> List[Dict[str, Any]]:
-    if Document is None:
-        return []
-    doc = Document(path)
+def _biases_from(paragraphs: Iterable[Tuple[str, bool]]) -> List[Dict[str, Any]]:
     out = []
     current = {}
-    for p in doc.paragraphs:
-        t = p.text.strip()
+    for text, heading in paragraphs:
+        t = text.strip()
         if not t:
             continue
-        if p.style and p.style.name and p.style.name.lower().startswith("heading"):
+        if heading:
             if current:
                 out.append(current)
             key = t.split("—")[0].strip().lower().replace(" ","_")
@@ -69,14 +140,121 @@ def _parse_biases_docx(path: str) -> List[Dict[str, Any]]:
         out.append(current)
     return out
 
-def build_kb_files():
+def _parse_services_docx(path: str) -> List[Dict[str, Any]]:
+    return _services_from(_docx_paragraphs(path))
+
+def _parse_biases_docx(path: str) -> List[Dict[str, Any]]:
+    return _biases_from(_docx_paragraphs(path))
+
+def parse_services(path: str) -> List[Dict[str, Any]]:
+    return _services_from(_stream_paragraphs(path))
+
+def parse_biases(path: str) -> List[Dict[str, Any]]:
+    return _biases_from(_stream_paragraphs(path))
+
+def _sections(paragraphs: Iterable[Tuple[str, bool]]) -> Iterator[List[Tuple[str, bool]]]:
+    # split at headings: the record builders start a new record at every heading, so each
+    # section derives to at most one record
+    section: List[Tuple[str, bool]] = []
+    for text, heading in paragraphs:
+        if heading and text.strip() and section:
+            yield section
+            section = []
+        section.append((text, heading))
+    if section:
+        yield section
+
+def _section_hash(section: List[Tuple[str, bool]]) -> str:
+    return hashlib.sha256(json.dumps(section, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _derive(path: str, derive, prev_records: List[Dict[str, Any]], prev_hashes: List[str]):
+    """Records and their section hashes; sections whose hash is unchanged reuse the previous record."""
+    known = dict(zip(prev_hashes, prev_records))
+    records, hashes, reused = [], [], 0
+    for section in _sections(_stream_paragraphs(path)):
+        h = _section_hash(section)
+        if h in known:
+            rec, reused = known[h], reused + 1
+        else:
+            out = derive(section)
+            if not out:
+                continue
+            rec = out[0]
+        records.append(rec)
+        hashes.append(h)
+    return records, hashes, reused
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read() or b"{}")
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _write_atomic(path: str, raw: bytes):
+    # write-then-rename: readers see the old file or the new one, never a partial write
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, path)
+
+def manifest_path() -> str:
+    return os.path.join(settings.DATA_DIR, "kb_manifest.json")
+
+def read_manifest() -> Dict[str, Any]:
+    return _read_json(manifest_path())
+
+# source name -> (source path setting, output file, top-level key, section record builder);
+# the SKU sheet has no sections and is re-read whole when its hash changes
+_SOURCES = {
+    "catalog": ("CATALOG_DOCX_PATH", "catalog.json", "services", _services_from),
+    "biases": ("BIASES_DOCX_PATH", "biases.json", "biases", _biases_from),
+    "prices": ("SKU_XLSX_PATH", "prices.json", "prices", None),
+}
+
+def build_kb_files(force: bool = False) -> Dict[str, Any]:
+    """Rebuild catalog.json / biases.json / prices.json from the sources and write kb_manifest.json.
+
+    A source whose sha256 matches the manifest is not parsed at all; inside a changed source only
+    sections (heading + body) whose hash changed are re-derived. Outputs are swapped in atomically.
+    Returns the manifest plus per-source build stats.
+    """
     os.makedirs(settings.DATA_DIR, exist_ok=True)
-    catalog_path = os.path.join(settings.DATA_DIR, "catalog.json")
-    biases_path = os.path.join(settings.DATA_DIR, "biases.json")
-    services = _parse_services_docx(settings.CATALOG_DOCX_PATH) if os.path.exists(settings.CATALOG_DOCX_PATH) else []
-    biases = _parse_biases_docx(settings.BIASES_DOCX_PATH) if os.path.exists(settings.BIASES_DOCX_PATH) else []
-
-    with open(catalog_path, "w", encoding="utf-8") as f:
-        json.dump({"services": services}, f, indent=2, ensure_ascii=False)
-    with open(biases_path, "w", encoding="utf-8") as f:
-        json.dump({"biases": biases}, f, indent=2, ensure_ascii=False)
+    prev = {} if force else read_manifest()
+    manifest: Dict[str, Any] = {"sources": {}, "counts": {}}
+    stats: Dict[str, Any] = {}
+    for name, (setting, filename, key, derive) in _SOURCES.items():
+        src = getattr(settings, setting)
+        out_path = os.path.join(settings.DATA_DIR, filename)
+        prev_src = prev.get("sources", {}).get(name, {})
+        current = _read_json(out_path).get(key) if os.path.exists(out_path) else None
+        digest = _file_hash(src) if os.path.exists(src) else None
+        unchanged = digest == prev_src.get("sha256") and src == prev_src.get("path")
+        if current is not None and (unchanged or digest is None):
+            # no source document (e.g. the bundled seed KB): keep the existing output as-is
+            records, hashes = current, prev_src.get("sections", []) if unchanged else []
+            stats[name] = {"changed": False, "derived": 0, "reused": len(records)}
+        else:
+            prev_records = current if current is not None and src == prev_src.get("path") else []
+            if not digest:
+                records, hashes, reused = {} if derive is None else [], [], 0
+            elif derive is None:
+                records, hashes, reused = ingest_xlsx.parse_prices(src), [], 0
+            else:
+                records, hashes, reused = _derive(src, derive, prev_records, prev_src.get("sections", []))
+            stats[name] = {"changed": True, "derived": len(records) - reused, "reused": reused}
+        if stats[name]["changed"]:
+            _write_atomic(out_path, json.dumps({key: records}, indent=2, ensure_ascii=False).encode("utf-8"))
+        manifest["sources"][name] = {"path": src, "sha256": digest, "sections": hashes}
+        manifest["counts"][key] = len(records)
+    manifest["version"] = kb_store.kb_version()  # what KBSnapshot.version will be
+    if manifest != {k: prev.get(k) for k in manifest}:
+        _write_atomic(manifest_path(), json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    return {**manifest, "build": stats}
@@ -0,0 +1,117 @@
+import re, zipfile, posixpath
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, List, Optional
+
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# normalised header -> price index field
+_COLUMNS = {
+    "serviceid": "service_id", "id": "service_id",
+    "service": "name", "servicename": "name", "name": "name",
+    "sku": "sku", "skucode": "sku", "code": "sku",
+    "price": "list_price", "listprice": "list_price", "priceusd": "list_price", "usd": "list_price",
+    "tier": "tier", "level": "tier",
+}
+
+def _norm(header: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", header.lower())
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    out = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, el in ET.iterparse(f):
+            if el.tag == _S + "si":
+                # plain <t> or rich-text runs <r><t>; phonetic <rPh> hints are not part of the value
+                out.append("".join(t.text or "" for t in el.findall(f"{_S}t") + el.findall(f"{_S}r/{_S}t")))
+                el.clear()
+    return out
+
+def _sheet_path(zf: zipfile.ZipFile, sheet: Optional[str]) -> str:
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheets = wb.findall(f"{_S}sheets/{_S}sheet")
+    chosen = next((s for s in sheets if s.get("name") == sheet), None) if sheet else sheets[0]
+    if chosen is None:
+        raise KeyError(f"sheet {sheet!r} not found")
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    target = next(r.get("Target") for r in rels.findall(f"{_PKG}Relationship")
+                  if r.get("Id") == chosen.get(_R + "id"))
+    return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+def _col(ref: str) -> int:
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + ord(ch.upper()) - 64
+    return n - 1
+
+def _rows(path: str, sheet: Optional[str] = None) -> Iterator[List[Any]]:
+    """Cell values row by row, iterparsed from the sheet XML; only shared strings are held in memory."""
+    with zipfile.ZipFile(path) as zf:
+        strings = _shared_strings(zf)
+        with zf.open(_sheet_path(zf, sheet)) as f:
+            for _, el in ET.iterparse(f):
+                if el.tag != _S + "row":
+                    continue
+                row: List[Any] = []
+                for c in el.findall(_S + "c"):
+                    idx = _col(c.get("r")) if c.get("r") else len(row)
+                    row += [None] * (idx - len(row) + 1)
+                    kind, v = c.get("t"), c.find(_S + "v")
+                    if kind == "inlineStr":
+                        row[idx] = "".join(t.text or "" for t in c.iter(_S + "t"))
+                    elif v is None or v.text is None:
+                        continue
+                    elif kind == "s":
+                        row[idx] = strings[int(v.text)]
+                    elif kind in ("str", "e"):
+                        row[idx] = v.text
+                    elif kind == "b":
+                        row[idx] = v.text == "1"
+                    else:
+                        row[idx] = float(v.text)
+                yield row
+                el.clear()
+
+def _text(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))  # numeric SKUs come back from the sheet as floats
+    return str(v).strip() or None
+
+def _price(v: Any) -> Optional[float]:
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        return float(re.sub(r"[^0-9.\-]", "", str(v)))
+    except ValueError:
+        return None
+
+def parse_prices(path: str, sheet: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """service_id -> {"sku", "list_price", "tier"} from the SKU price sheet.
+
+    The first non-empty row is the header; service_id falls back to the service name slugged the
+    way ingest_docx does it. The first row for a service wins."""
+    index: Dict[str, Dict[str, Any]] = {}
+    fields: Optional[Dict[int, str]] = None
+    for row in _rows(path, sheet):
+        if fields is None:
+            if any(v is not None for v in row):
+                fields = {i: _COLUMNS[_norm(str(v))] for i, v in enumerate(row)
+                          if v is not None and _norm(str(v)) in _COLUMNS}
+            continue
+        rec = {f: row[i] for i, f in fields.items() if i < len(row)}
+        name = _text(rec.get("name"))
+        sid = _text(rec.get("service_id")) or (name.lower().replace(" ", "_") if name else None)
+        if not sid or sid in index:
+            continue
+        index[sid] = {"sku": _text(rec.get("sku")), "list_price": _price(rec.get("list_price")),
+                      "tier": _text(rec.get("tier"))}
+    return index
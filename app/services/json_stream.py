@@ -0,0 +1,58 @@
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+class ArrayItemParser:
+    """Incremental parser for LLM output shaped like {"key": [{...}, {...}], ...}.
+
+    feed() takes raw text chunks and yields (key, item) for every object element of a
+    top-level array as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = -1
+        self._last_str = ""
+        self._key = ""
+        self._item_start = -1
+
+    def feed(self, chunk: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._last_str = text[self._str_start + 1:i]
+                continue
+            if c == '"':
+                self._in_str, self._str_start = True, i
+            elif c in "{[":
+                if c == "[" and self._depth == 1:
+                    self._key = self._last_str
+                elif c == "{" and self._depth == 2:
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if c == "}" and self._depth == 2 and self._item_start >= 0:
+                    try:
+                        item = json.loads(text[self._item_start:i + 1])
+                    except ValueError:
+                        item = None
+                    self._item_start = -1
+                    if isinstance(item, dict):
+                        yield self._key, item
+        self._pos = len(text)
+
+    def result(self) -> Any:
+        return json.loads(self.text)
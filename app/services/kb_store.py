@@ -1,39 +1,224 @@
-import json, math
-from typing import List, Tuple, Dict, Any
+import asyncio, json, logging, os, hashlib, threading, time, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+import numpy as np
+from typing import List, Tuple, Dict, Any, Optional
+from app.config import settings
+from app.services import embeddings, metrics, rules
+from app.services.bm25 import BM25Index, service_text, bias_text, query_text
+
+log = logging.getLogger(__name__)
+
+def _kb_paths() -> Tuple[str, str, str, str]:
+    return (os.path.join(settings.DATA_DIR, "catalog.json"),
+            os.path.join(settings.DATA_DIR, "biases.json"),
+            os.path.join(settings.DATA_DIR, "prices.json"),
+            os.path.join(settings.DATA_DIR, "rules.json"))
+
+def _read_raw(paths) -> Tuple[List[Optional[bytes]], str]:
+    # file contents (None if missing) and the KB version: a content hash over all of them
+    h = hashlib.sha256()
+    raws: List[Optional[bytes]] = []
+    for p in paths:
+        try:
+            with open(p, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = None
+        h.update(b"{}" if raw is None else raw)
+        raws.append(raw)
+    return raws, h.hexdigest()[:16]
+
+def kb_version() -> str:
+    """Version of the KB files currently on disk (what the next snapshot will carry)."""
+    return _read_raw(_kb_paths())[1]
+
+def _stat(paths) -> Tuple[Tuple[int,int], ...]:
+    # (mtime_ns, size) per file; a missing file stats as (0, 0) so it still compares cheaply
+    out = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            out.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            out.append((0, 0))
+    return tuple(out)
+
+@dataclass(frozen=True)
+class KBSnapshot:
+    services: List[Dict[str,Any]]
+    biases: List[Dict[str,Any]]
+    version: str  # content hash of catalog.json + biases.json + prices.json + rules.json
+    stamp: Tuple[Tuple[int,int], ...]
+    prices: Dict[str, Dict[str,Any]]  # service_id -> {"sku", "list_price", "tier"}
+    rules: rules.Rules  # guardrails compiled from rules.json + catalog constraints
+    service_index: BM25Index
+    bias_index: BM25Index
+    service_vecs: Optional[np.ndarray] = None  # rows align with services; None until embedded
+    bias_vecs: Optional[np.ndarray] = None
+
+def _doc_texts(items: List[Dict[str,Any]], kind: str, id_field: str, text_fn) -> Dict[str,str]:
+    out: Dict[str,str] = {}
+    for it in items:
+        key = f"{kind}:{it.get(id_field, '')}"
+        while key in out:
+            key += "#"
+        out[key] = text_fn(it)
+    return out
+
+def _service_docs(snap: KBSnapshot) -> Dict[str,str]:
+    return _doc_texts(snap.services, "service", "service_id", service_text)
+
+def _bias_docs(snap: KBSnapshot) -> Dict[str,str]:
+    return _doc_texts(snap.biases, "bias", "key", bias_text)
+
+def _with_vectors(snap: KBSnapshot) -> KBSnapshot:
+    snap = replace(snap, service_vecs=embeddings.load_matrix(_service_docs(snap)),
+                   bias_vecs=embeddings.load_matrix(_bias_docs(snap)))
+    if _vectors_missing(snap):
+        log.warning("KB %s has documents without stored embeddings; retrieval falls back to BM25 "
+                    "until they are embedded", snap.version)
+    return snap
+
+def _vectors_missing(snap: KBSnapshot) -> bool:
+    return bool((snap.services and snap.service_vecs is None) or (snap.biases and snap.bias_vecs is None))
+
+def _load_snapshot(vectors: bool = True) -> KBSnapshot:
+    paths = _kb_paths()
+    stamp = _stat(paths)
+    raws, version = _read_raw(paths)
+    docs = [json.loads(raw or b"{}") for raw in raws[:3]]
+    spec = rules.default_spec() if raws[3] is None else json.loads(raws[3] or b"{}")
+    biases, prices = docs[1].get("biases", []), docs[2].get("prices", {})
+    services = [{**s, **prices[s["service_id"]]} if s.get("service_id") in prices else s
+                for s in docs[0].get("services", [])]
+    snap = KBSnapshot(services=services, biases=biases, version=version, stamp=stamp, prices=prices,
+                      rules=rules.compile_rules(spec, services),
+                      service_index=BM25Index(service_text(s) for s in services),
+                      bias_index=BM25Index(bias_text(b) for b in biases))
+    return _with_vectors(snap) if vectors and settings.KB_RETRIEVER == "vector" else snap
+
+_lock = threading.Lock()
+_snapshot: Optional[KBSnapshot] = None
+_reloading = threading.Event()
+_embedding = threading.Event()  # a background embed of an auto-reloaded KB is queued or running
+
+def get_snapshot() -> KBSnapshot:
+    """Process-wide KB snapshot; re-parsed only when catalog/biases/prices mtime or size change.
+
+    Snapshots are immutable: callers that need a consistent view hold on to the one they got.
+    While an admin reload is rewriting the files the current snapshot keeps being served."""
+    global _snapshot
+    snap = _snapshot
+    if snap is not None and (_reloading.is_set() or snap.stamp == _stat(_kb_paths())):
+        return snap
+    with _lock:
+        if _snapshot is None or (not _reloading.is_set() and _snapshot.stamp != _stat(_kb_paths())):
+            _snapshot = _load_snapshot()
+            if settings.KB_RETRIEVER == "vector" and _vectors_missing(_snapshot) and not _embedding.is_set():
+                # files changed outside /admin/reload-kb: embed the new documents off the request path
+                _embedding.set()
+                _reload_pool.submit(_embed_refresh)
+        return _snapshot
 
 def _read_kb() -> Tuple[List[Dict[str,Any]], List[Dict[str,Any]]]:
-    with open("./data/catalog.json", "r", encoding="utf-8") as f:
-        services = json.load(f).get("services", [])
-    with open("./data/biases.json", "r", encoding="utf-8") as f:
-        biases = json.load(f).get("biases", [])
-    return services, biases
-
-def _bofe(text: str) -> Dict[str, float]:
-    words = [w.lower() for w in text.split()]
-    vec = {}
-    for w in words:
-        vec[w] = vec.get(w,0)+1.0
-    return vec
-
-def _cos(a: Dict[str,float], b: Dict[str,float]) -> float:
-    dot = sum(a.get(k,0.0)*b.get(k,0.0) for k in set(a)|set(b))
-    na = math.sqrt(sum(v*v for v in a.values())) or 1.0
-    nb = math.sqrt(sum(v*v for v in b.values())) or 1.0
-    return dot/(na*nb)
-
-def build_or_refresh():
-    return True
-
-def retrieve_context(intake_facts: Dict[str,Any], k: int = 8) -> Dict[str,Any]:
-    services, biases = _read_kb()
-    query = " ".join([f"{k}:{v}" for k,v in intake_facts.items() if isinstance(v,(str,int,float))])
-    qv = _bofe(query or "query")
-    scored_s = sorted(
-        [(s, _cos(qv, _bofe(s.get('name','')+' '+ ' '.join(s.get('deliverables',[]))))) for s in services],
-        key=lambda x: x[1], reverse=True
-    )[:max(3, min(k,8))]
-    scored_b = sorted(
-        [(b, _cos(qv, _bofe(b.get('name','')+' '+ b.get('definition','')+' '+' '.join(b.get('copy_patterns',[]))))) for b in biases],
-        key=lambda x: x[1], reverse=True
-    )[:max(3, min(k,8))]
-    return {"services": [s for s,_ in scored_s], "biases": [b for b,_ in scored_b]}
+    snap = get_snapshot()
+    return snap.services, snap.biases
+
+_build_lock = threading.Lock()
+
+def build_or_refresh() -> KBSnapshot:
+    """Reload the KB from disk and embed any new/changed documents into KB_SQLITE_PATH.
+
+    The new snapshot is built off to the side and swapped in with one assignment; readers are
+    never blocked and requests already holding the old snapshot finish on it."""
+    global _snapshot
+    with _build_lock:
+        snap = _load_snapshot(vectors=False)
+        if settings.KB_RETRIEVER == "vector":
+            embeddings.sync({**_service_docs(snap), **_bias_docs(snap)})
+            snap = _with_vectors(snap)
+        _snapshot = snap
+    return snap
+
+def _embed_refresh():
+    try:
+        build_or_refresh()
+    except Exception:
+        log.exception("embedding the reloaded KB failed")
+    finally:
+        _embedding.clear()
+
+def warm():
+    """Startup: load the KB snapshot; with KB_RETRIEVER=vector, embed whatever the store lacks."""
+    if settings.KB_RETRIEVER == "vector":
+        build_or_refresh()
+    else:
+        get_snapshot()
+
+# reload id -> status; newest last, only the most recent few are kept
+_reloads: "OrderedDict[str, Dict[str,Any]]" = OrderedDict()
+_reload_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-reload")
+
+def _run_reload(reload_id: str, force: bool):
+    from app.services import ingest_docx
+    st = _reloads[reload_id]
+    st.update(status="running", startedAt=time.time())
+    _reloading.set()
+    try:
+        manifest = ingest_docx.build_kb_files(force=force)
+        snap = build_or_refresh()
+        st.update(status="done", kbVersion=snap.version, counts=manifest["counts"], build=manifest["build"])
+    except Exception as e:
+        st.update(status="error", error=f"{type(e).__name__}: {e}"[:500])
+    finally:
+        _reloading.clear()
+        st["finishedAt"] = time.time()
+
+def start_reload(force: bool = False) -> str:
+    """Queue a background ingest + snapshot rebuild; returns its reload id. Reloads run one at a
+    time, and a request made while another is still queued joins that one."""
+    for rid, st in reversed(_reloads.items()):
+        if st["status"] == "pending" and st["force"] == force:
+            return rid
+        break
+    rid = uuid.uuid4().hex
+    _reloads[rid] = {"reloadId": rid, "status": "pending", "force": force, "previousVersion": get_snapshot().version}
+    while len(_reloads) > 50:
+        _reloads.popitem(last=False)
+    _reload_pool.submit(_run_reload, rid, force)
+    return rid
+
+def reload_status(reload_id: str) -> Optional[Dict[str,Any]]:
+    st = _reloads.get(reload_id)
+    return dict(st) if st is not None else None
+
+def price_of(service_id: str, snap: Optional[KBSnapshot] = None) -> Optional[Dict[str,Any]]:
+    """{"sku", "list_price", "tier"} for a service from the SKU price index, or None."""
+    return (snap or get_snapshot()).prices.get(service_id)
+
+def _top(snap_vecs: Optional[np.ndarray], index: BM25Index, qvec, query: str, n: int):
+    if snap_vecs is not None and qvec is not None:
+        return embeddings.top(snap_vecs, qvec, n)
+    return index.top(query, n)
+
+@metrics.timed("retrieve")
+def retrieve_context(intake_facts: Dict[str,Any], k: int = 8, snap: Optional[KBSnapshot] = None) -> Dict[str,Any]:
+    snap = snap or get_snapshot()
+    query = query_text(intake_facts) or "query"
+    n = max(3, min(k,8))
+    qvec = None
+    if snap.service_vecs is not None or snap.bias_vecs is not None:
+        qvec = embeddings.embed([query])[0]
+    top_s = _top(snap.service_vecs, snap.service_index, qvec, query, n)
+    top_b = _top(snap.bias_vecs, snap.bias_index, qvec, query, n)
+    return {"services": [snap.services[i] for i,_ in top_s], "biases": [snap.biases[i] for i,_ in top_b]}
+
+async def aretrieve_context(intake_facts: Dict[str,Any], k: int = 8, snap: Optional[KBSnapshot] = None) -> Dict[str,Any]:
+    """retrieve_context for async callers; runs in a worker thread when embedding the query is an
+    HTTP call (KB_EMBEDDER=openai with vectors loaded)."""
+    snap = snap or get_snapshot()
+    if (snap.service_vecs is None and snap.bias_vecs is None) or not embeddings.remote():
+        return retrieve_context(intake_facts, k, snap)
+    return await asyncio.to_thread(retrieve_context, intake_facts, k, snap)
@@ -0,0 +1,94 @@
+import json, logging, time
+from typing import Optional, Dict, Any, AsyncIterator
+import httpx
+from app.config import settings
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+# One long-lived client per process so every LLM call reuses the same keep-alive pool.
+_client = None
+_sync_client = None
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=settings.LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+                        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_S)
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_TIMEOUT_S, connect=settings.LLM_CONNECT_TIMEOUT_S)
+
+def get_client():
+    """Shared AsyncOpenAI client; created at startup, or lazily on first use."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=settings.LLM_MAX_RETRIES,
+                              http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()))
+    return _client
+
+def get_sync_client():
+    """Shared blocking client for the few sync call sites (KB embedding)."""
+    global _sync_client
+    if _sync_client is None:
+        from openai import OpenAI
+        _sync_client = OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=settings.LLM_MAX_RETRIES,
+                              http_client=httpx.Client(limits=_limits(), timeout=_timeout()))
+    return _sync_client
+
+async def startup():
+    if settings.OPENAI_API_KEY:
+        get_client()
+
+async def shutdown():
+    global _client, _sync_client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+def _log_usage(label: str, tag: str, model: str, usage: Any, started: float):
+    # one line per completion: prompt/completion tokens and wall time, keyed for cost per intake
+    log.info("llm_call label=%s tag=%s model=%s prompt_tokens=%s completion_tokens=%s latency_ms=%.0f",
+             label, tag, model, getattr(usage, "prompt_tokens", None),
+             getattr(usage, "completion_tokens", None), (time.perf_counter() - started) * 1000)
+    for kind in ("prompt", "completion"):
+        n = getattr(usage, f"{kind}_tokens", None)
+        if n:
+            metrics.inc("llm_tokens_total", n, call=label, kind=kind)
+
+async def chat_json(system: str, user: str, temperature: float = 0.3,
+                    model: Optional[str] = None, label: str = "chat", tag: str = "") -> Dict[str, Any]:
+    model = model or settings.OPENAI_MODEL
+    started = time.perf_counter()
+    resp = await get_client().chat.completions.create(
+        model=model,
+        response_format={"type":"json_object"},
+        temperature=temperature,
+        messages=[{"role":"system","content":system},{"role":"user","content":user}],
+    )
+    _log_usage(label, tag, model, resp.usage, started)
+    return json.loads(resp.choices[0].message.content)
+
+async def chat_json_stream(system: str, user: str, temperature: float = 0.3,
+                           model: Optional[str] = None, label: str = "chat", tag: str = "") -> AsyncIterator[str]:
+    """Yield raw content deltas of a JSON-mode completion as they arrive."""
+    model = model or settings.OPENAI_MODEL
+    started = time.perf_counter()
+    stream = await get_client().chat.completions.create(
+        model=model,
+        response_format={"type":"json_object"},
+        temperature=temperature,
+        messages=[{"role":"system","content":system},{"role":"user","content":user}],
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    usage = None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage  # final chunk, no choices
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+    _log_usage(label, tag, model, usage, started)
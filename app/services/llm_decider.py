@@ -1,25 +1,13 @@
-from typing import Dict, Any, List
+import asyncio, logging, time
+from typing import Dict, Any, List, AsyncIterator, Tuple, Optional
 from pydantic import BaseModel, Field, ValidationError
-from app.services import kb_store
+from app.services import kb_store, llm_client, metrics, planner, prompts
+from app.services.cache import SingleFlight, TTLCache, canonical_key
+from app.services.json_stream import ArrayItemParser
+from app.services.hedging import LatencyTracker, hedged
 from app.config import settings
 
-def _enforce_rules(answers: dict, proposed_services: List[dict]) -> List[dict]:
-    out = []
-    vacant = answers.get("occupancy") == "vacant"
-    tight = bool(answers.get("tightRooms"))
-    likely_remote = answers.get("likelyBuyer") == "remote_buyer"
-    for s in proposed_services:
-        sid = s.get("service_id","")
-        if sid == "virtual_staging" and not vacant and not answers.get("explicitVirtualStagingOK", False):
-            continue
-        if sid == "exterior_only" and not answers.get("busy_street_special_case", False):
-            continue
-        out.append(s)
-    if tight and all(s.get("service_id")!="2d_floor_plan" for s in out):
-        out.insert(0, {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Tight rooms benefit from schematic clarity."})
-    if likely_remote and all(s.get("service_id")!="zillow_3d" for s in out):
-        out.insert(0, {"service_id":"zillow_3d","name":"Zillow 3D Tour","rationale":"Remote buyers need spatial continuity."})
-    return out
+log = logging.getLogger(__name__)
 
 class _BiasMini(BaseModel):
     key: str
@@ -42,58 +30,213 @@ class _Decision(BaseModel):
     stacks: List[_Stack]
     biases: List[_BiasMini]
 
-def _call_llm(intake: dict, sigs: dict, context: dict) -> dict:
-    # Offline deterministic sample if no API key
-    if not settings.OPENAI_API_KEY:
-        return {
-            "stacks":[
-                {"tier":"High","services":[
-                    {"service_id":"show_stopper","name":"Show Stopper","rationale":"Flagship visuals."},
-                    {"service_id":"aerials","name":"Aerials","rationale":"Context and scale."}
-                ],"rationale":"Max impact"},
-                {"tier":"Medium","services":[
-                    {"service_id":"zillow_3d","name":"Zillow 3D","rationale":"Continuity."},
-                    {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Clarity."}
-                ],"rationale":"Core remote-friendly"},
-                {"tier":"Low","services":[
-                    {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Clarity."},
-                    {"service_id":"quick_snaps","name":"Quick Snaps","rationale":"Speed."}
-                ],"rationale":"Lean, fast"}
-            ],
-            "biases":[
-                {"key":"fluency","name":"Fluency","definition":"Ease","why":"Tight rooms / remote buyers","executionBullets":["Chunk specs","Simple headlines"]},
-                {"key":"mere_exposure","name":"Mere Exposure","definition":"Familiarity","why":"Build repetition","executionBullets":["Series posts","Retargeting"]},
-                {"key":"anchoring","name":"Anchoring","definition":"Lead with best","why":"Signature feature","executionBullets":["Lead with hero","Frame comparisons"]}
-            ]
-        }
-    # Real LLM call (if key present)
-    from openai import OpenAI
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    sys = ("You are a marketing-production planner for residential listings. "
+def _offline_decision() -> dict:
+    return {
+        "stacks":[
+            {"tier":"High","services":[
+                {"service_id":"show_stopper","name":"Show Stopper","rationale":"Flagship visuals."},
+                {"service_id":"aerials","name":"Aerials","rationale":"Context and scale."}
+            ],"rationale":"Max impact"},
+            {"tier":"Medium","services":[
+                {"service_id":"zillow_3d","name":"Zillow 3D","rationale":"Continuity."},
+                {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Clarity."}
+            ],"rationale":"Core remote-friendly"},
+            {"tier":"Low","services":[
+                {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Clarity."},
+                {"service_id":"quick_snaps","name":"Quick Snaps","rationale":"Speed."}
+            ],"rationale":"Lean, fast"}
+        ],
+        "biases":[
+            {"key":"fluency","name":"Fluency","definition":"Ease","why":"Tight rooms / remote buyers","executionBullets":["Chunk specs","Simple headlines"]},
+            {"key":"mere_exposure","name":"Mere Exposure","definition":"Familiarity","why":"Build repetition","executionBullets":["Series posts","Retargeting"]},
+            {"key":"anchoring","name":"Anchoring","definition":"Lead with best","why":"Signature feature","executionBullets":["Lead with hero","Frame comparisons"]}
+        ]
+    }
+
+_SYSTEM = ("You are a marketing-production planner for residential listings. "
            "Compliance: schools/safety language must be factual; post-production limited to non-material removals + sky/grass. "
            "Return structured JSON only.")
-    prompt = {"intake_facts": intake, "signals": sigs, "catalog_snippets": context,
-              "instructions":{"always_three_tiers":True,"tiers":["High","Medium","Low"],"bias_count":3}}
-    resp = client.chat.completions.create(
-        model=settings.OPENAI_MODEL,
-        response_format={"type":"json_object"},
-        messages=[{"role":"system","content":sys},{"role":"user","content":str(prompt)}],
-        temperature=0.3,
-    )
-    import json
-    return json.loads(resp.choices[0].message.content)
-
-def decide(answers: dict, sigs: dict, mode: str) -> dict:
-    ctx = kb_store.retrieve_context(answers, k=8)
-    raw = _call_llm(answers, sigs, ctx)
+
+def _prompt(intake: dict, sigs: dict, context: dict, draft: dict) -> str:
+    prompt = {"intake_facts": intake, "signals": sigs, "catalog_snippets": prompts.context(context),
+              "draft_plan": {"stacks": [prompts.stack(st) for st in draft["stacks"]], "biases": draft["biases"]},
+              "instructions":{"always_three_tiers":True,"tiers":["High","Medium","Low"],"bias_count":3,
+                              "refine_draft":True}}
+    return prompts.dumps(prompt)
+
+async def _call_llm(intake: dict, sigs: dict, context: dict, draft: dict) -> dict:
+    return await llm_client.chat_json(_SYSTEM, _prompt(intake, sigs, context, draft), temperature=0.3,
+                                      label="decide", tag=canonical_key(intake)[:12])
+
+async def _stream_llm(intake: dict, sigs: dict, context: dict, draft: dict) -> AsyncIterator[str]:
+    async for delta in llm_client.chat_json_stream(_SYSTEM, _prompt(intake, sigs, context, draft), temperature=0.3,
+                                                   label="decide_stream", tag=canonical_key(intake)[:12]):
+        yield delta
+
+def _draft(answers: dict, sigs: dict, snap: kb_store.KBSnapshot) -> dict:
+    """Local planner's decision for this KB snapshot (the canned sample only if the KB is empty)."""
+    return _Decision.model_validate(planner.plan(answers, sigs, snap) or _offline_decision()).model_dump()
+
+decision_cache = TTLCache("decision", maxsize=settings.DECISION_CACHE_SIZE,
+                          ttl_s=settings.DECISION_CACHE_TTL_S, path=settings.DECISION_CACHE_PATH)
+
+def _cache_key(answers: dict, sigs: dict, kb_version: str) -> str:
+    # KB version is part of the key, so a KB reload makes every older entry unreachable
+    return canonical_key(answers, sigs, settings.OPENAI_MODEL, kb_version)
+
+latency = LatencyTracker(name="decide")
+# identical refinements already in flight (double-clicks, form retries) share one LLM round trip
+inflight = SingleFlight("decide")
+
+def _budget(mode: str) -> float:
+    return settings.LLM_BUDGET_DEEP_DIVE_S if mode == "deep_dive" else settings.LLM_BUDGET_LIGHTING_S
+
+async def _decide_llm(answers: dict, sigs: dict, ctx: dict, budget_s: float, draft: dict) -> Tuple[dict, Optional[str]]:
+    """Validated LLM refinement of draft within budget_s (hedged; an invalid reply counts as a
+    failed attempt), else the draft itself plus the reason it was used."""
+    async def attempt():
+        raw = await _call_llm(answers, sigs, ctx, draft)
+        with metrics.span("validate"):
+            return _Decision.model_validate(raw).model_dump()
     try:
-        dec = _Decision.model_validate(raw)
-    except Exception:
-        dec = _Decision.model_validate(_call_llm(answers, sigs, ctx))
-
-    stacks = []
-    for st in dec.stacks:
-        pruned = _enforce_rules(answers, [s.model_dump() for s in st.services])
-        stacks.append({"tier":st.tier, "services": pruned, "rationale": st.rationale})
-    biases = [b.model_dump() for b in dec.biases]
-    return {"stacks": stacks, "biases": biases}
+        with metrics.span("llm"):
+            return await hedged(attempt, budget_s, latency), None
+    except asyncio.TimeoutError:
+        reason = f"LLM budget of {budget_s:.1f}s exceeded"
+    except Exception as e:
+        reason = f"{type(e).__name__}: {e}"
+    log.warning("decide fell back to the planner's draft: %s", reason)
+    metrics.inc("fallbacks_total", call="decide")
+    return draft, reason
+
+def _price_stack(services: List[dict], snap: kb_store.KBSnapshot) -> Optional[float]:
+    # O(1) lookups in the KB's SKU price index; total is None when no service in the stack is priced
+    total = None
+    for s in services:
+        price = kb_store.price_of(s.get("service_id", ""), snap)
+        if price and price.get("list_price") is not None:
+            s["sku"], s["list_price"] = price["sku"], price["list_price"]
+            total = (total or 0.0) + price["list_price"]
+    return total
+
+def _stack_out(st: dict, services: List[dict], snap: kb_store.KBSnapshot) -> dict:
+    return {"tier":st["tier"], "services": services, "rationale": st["rationale"], "total": _price_stack(services, snap)}
+
+def _finalize_stack(answers: dict, st: dict, snap: Optional[kb_store.KBSnapshot] = None) -> dict:
+    snap = snap or kb_store.get_snapshot()
+    return _stack_out(st, snap.rules.apply(answers, [dict(s) for s in st["services"]]), snap)
+
+def _finalize(answers: dict, dec: dict, snap: kb_store.KBSnapshot, fallback: Optional[str] = None,
+              source: str = "llm") -> dict:
+    # guardrails for all stacks in one pass over the snapshot's compiled rules
+    guarded = snap.rules.apply_stacks(answers, [[dict(s) for s in st["services"]] for st in dec["stacks"]])
+    stacks = [_stack_out(st, services, snap) for st, services in zip(dec["stacks"], guarded)]
+    biases = [dict(b) for b in dec["biases"]]
+    return {"stacks": stacks, "biases": biases, "fallback": fallback is not None, "kbVersion": snap.version,
+            "source": "planner" if fallback is not None else source}
+
+def _refine(refine: Optional[bool]) -> bool:
+    # without an API key there is nothing to refine with: the planner answers, uncached
+    return bool(settings.LLM_REFINE if refine is None else refine) and bool(settings.OPENAI_API_KEY)
+
+async def decide(answers: dict, sigs: dict, mode: str, budget_s: Optional[float] = None,
+                 refine: Optional[bool] = None) -> dict:
+    """Stacks + bias plans from the local planner; with refine (default LLM_REFINE) and an API key the LLM
+    polishes the planner's draft. "fallback" is true when that refinement missed the budget or
+    failed and the draft was returned instead (never cached). "source" says which one answered;
+    "kbVersion" is the KB snapshot the whole decision was computed against."""
+    snap = kb_store.get_snapshot()
+    draft = _draft(answers, sigs, snap)
+    if not _refine(refine):
+        return _finalize(answers, draft, snap, source="planner")
+    key = _cache_key(answers, sigs, snap.version)
+    cached = await decision_cache.aget(key)
+    metrics.inc("decision_cache_total", result="miss" if cached is None else "hit")
+    fallback = None
+    if cached is None:
+        async def refine_once() -> Tuple[dict, Optional[str]]:
+            ctx = await kb_store.aretrieve_context(answers, k=8, snap=snap)
+            dec, reason = await _decide_llm(answers, sigs, ctx, budget_s or _budget(mode), draft)
+            if reason is None:
+                await decision_cache.aset(key, dec)
+            return dec, reason
+        cached, fallback = await inflight.do(key, refine_once)
+    return _finalize(answers, cached, snap, fallback)
+
+async def _within(stream: AsyncIterator[str], deadline: float) -> AsyncIterator[str]:
+    # items of stream until the monotonic deadline, then asyncio.TimeoutError; the wait for each
+    # item is what gets cancelled, never the consumer while it holds an item
+    try:
+        while True:
+            try:
+                async with asyncio.timeout(deadline - time.monotonic()):
+                    delta = await anext(stream)
+            except StopAsyncIteration:
+                return
+            yield delta
+    finally:
+        await stream.aclose()
+
+async def decide_stream(answers: dict, sigs: dict, mode: str,
+                        refine: Optional[bool] = None) -> AsyncIterator[Tuple[str, dict]]:
+    """Yield ("stack", stack) / ("bias", bias) as each element of the LLM JSON parses, then
+    ("done", result) with the same payload decide() returns. Stacks are guardrailed as
+    they arrive; the "done" result is authoritative if the stream had to be retried.
+    Without refine the planner's stacks and biases are emitted straight away."""
+    snap = kb_store.get_snapshot()
+    draft = _draft(answers, sigs, snap)
+    if not _refine(refine):
+        result = _finalize(answers, draft, snap, source="planner")
+        for st in result["stacks"]:
+            yield "stack", st
+        for b in result["biases"]:
+            yield "bias", b
+        yield "done", result
+        return
+    key = _cache_key(answers, sigs, snap.version)
+    cached = await decision_cache.aget(key)
+    metrics.inc("decision_cache_total", result="miss" if cached is None else "hit")
+    fallback = None
+    if cached is None:
+        ctx = await kb_store.aretrieve_context(answers, k=8, snap=snap)
+        budget_s = _budget(mode)
+        deadline = time.monotonic() + budget_s
+        parser = ArrayItemParser()
+        try:
+            # the budget covers the whole stream, time spent by the consumer between items included
+            async for delta in _within(_stream_llm(answers, sigs, ctx, draft), deadline):
+                for field, item in parser.feed(delta):
+                    try:
+                        if field == "stacks":
+                            yield "stack", _finalize_stack(answers, _Stack.model_validate(item).model_dump(), snap)
+                        elif field == "biases":
+                            yield "bias", _BiasMini.model_validate(item).model_dump()
+                    except ValidationError:
+                        continue
+        except asyncio.TimeoutError:
+            fallback = f"LLM budget of {budget_s:.1f}s exceeded"
+        except Exception as e:
+            fallback = f"{type(e).__name__}: {e}"
+        if fallback is None:
+            try:
+                with metrics.span("validate"):
+                    cached = _Decision.model_validate(parser.result()).model_dump()
+            except Exception:
+                # a non-streamed retry gets only what is left of the budget
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    cached, fallback = await _decide_llm(answers, sigs, ctx, remaining, draft)
+                else:
+                    fallback = f"LLM budget of {budget_s:.1f}s exceeded"
+        if fallback is None:
+            await decision_cache.aset(key, cached)
+        elif cached is None:
+            log.warning("decide_stream fell back to the planner's draft: %s", fallback)
+            metrics.inc("fallbacks_total", call="decide_stream")
+            cached = draft
+    else:
+        for st in cached["stacks"]:
+            yield "stack", _finalize_stack(answers, st, snap)
+        for b in cached["biases"]:
+            yield "bias", dict(b)
+    yield "done", _finalize(answers, cached, snap, fallback)
@@ -0,0 +1,142 @@
+import contextvars, functools, inspect, threading, time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# In-process metrics in Prometheus text format (served at /metrics); no client library or
+# push gateway. Each worker process keeps its own numbers, as prometheus_client does.
+PREFIX = "launchpad"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_stages: Dict[str, List[float]] = {}  # stage -> per-bucket counts (+Inf last), then sum
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_HELP = {
+    "stage_seconds": "Time spent per request stage",
+    "decision_cache_total": "Decision cache lookups by result",
+    "llm_attempts_total": "Extra LLM attempts launched by hedging, by call and reason",
+    "fallbacks_total": "Answers served from the local fallback instead of the LLM",
+    "llm_tokens_total": "LLM tokens by call and kind",
+    "singleflight_calls_total": "Calls a single-flight group actually ran",
+    "singleflight_shared_total": "Callers that joined a call already in flight",
+    "singleflight_errors_total": "Single-flight calls that raised",
+    "singleflight_inflight": "Single-flight calls running now",
+    "singleflight_waiters": "Callers awaiting a single-flight call now",
+}
+
+# (stage, seconds) for the current request while Server-Timing is on
+Timings = List[Tuple[str, float]]
+_timings: contextvars.ContextVar[Optional[Timings]] = contextvars.ContextVar("timings", default=None)
+
+def record(stage: str, seconds: float):
+    with _lock:
+        h = _stages.get(stage)
+        if h is None:
+            h = _stages[stage] = [0.0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(BUCKETS)] += 1
+        h[-1] += seconds
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+def inc(name: str, value: float = 1.0, **labels: str):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+def gauge(name: str, value: float, **labels: str):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _gauges[key] = value
+
+@contextmanager
+def span(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0)
+
+def timed(stage: str):
+    """Decorator form of span() for sync and async functions."""
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+def _labels(pairs) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+def render() -> str:
+    with _lock:
+        stages = {k: list(v) for k, v in _stages.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    name = f"{PREFIX}_stage_seconds"
+    lines = [f"# HELP {name} {_HELP['stage_seconds']}", f"# TYPE {name} histogram"]
+    for stage in sorted(stages):
+        h, cum = stages[stage], 0.0
+        for bound, n in zip((*BUCKETS, "+Inf"), h):
+            cum += n
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cum:g}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {h[-1]:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {cum:g}')
+    for kind, values in (("counter", counters), ("gauge", gauges)):
+        for metric in sorted({k[0] for k in values}):
+            lines += [f"# HELP {PREFIX}_{metric} {_HELP.get(metric, metric)}", f"# TYPE {PREFIX}_{metric} {kind}"]
+            for (m, pairs), v in sorted(values.items()):
+                if m == metric:
+                    lines.append(f"{PREFIX}_{m}{_labels(pairs)} {v:g}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _gauges.clear()
+
+def _server_timing(timings: Timings, total: float) -> str:
+    # repeated stages (e.g. several commits) are summed, in first-seen order
+    merged: Dict[str, float] = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    return ", ".join(f"{k};dur={v * 1000:.1f}" for k, v in [*merged.items(), ("total", total)])
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header listing the spans that finished before the response started
+    (a streamed body's own spans come too late for the header)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: Timings = []
+        token = _timings.set(timings)
+        t0 = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                value = _server_timing(timings, time.perf_counter() - t0).encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value)]}
+            await send(message)
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _timings.reset(token)
@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# How strongly each signal argues for a bias; biases not listed score on the mean signal.
+BIAS_SIGNALS: Dict[str, Dict[str, float]] = {
+    "fluency": {"clarityNeed": 0.7, "complexity": 0.3},
+    "anchoring": {"brandLift": 0.8, "complexity": 0.2},
+    "mere_exposure": {"momentumPressure": 0.6, "locationEfficiency": 0.4},
+    "loss_aversion": {"momentumPressure": 0.9, "brandLift": 0.1},
+    "authority": {"brandLift": 0.6, "locationEfficiency": 0.4},
+    "social_proof": {"locationEfficiency": 0.7, "momentumPressure": 0.3},
+    "novelty": {"brandLift": 0.5, "complexity": 0.5},
+    "scarcity": {"momentumPressure": 0.7, "brandLift": 0.3},
+}
+
+# price bands as the catalog spells them and as ingested from the .docx ("$".."$$$"); anything
+# else ("unknown", blank) counts as medium
+_BAND = {"low": 0, "medium": 1, "high": 2, "$": 0, "$$": 1, "$$$": 2}
+_BAND_NAMES = ("Low", "Medium", "High")
+# tier -> (most expensive price band allowed, stack size, weight on price band)
+TIERS: Tuple[Tuple[str, int, int, float], ...] = (
+    ("High", 2, 4, 0.15),
+    ("Medium", 1, 3, 0.0),
+    ("Low", 0, 2, -0.15),
+)
+_TIER_RATIONALE = {"High": "Max impact", "Medium": "Core coverage at a balanced spend", "Low": "Lean, fast"}
+_GENERIC_BULLETS = ["Lead every asset with the same message", "Repeat it across listing, social and email"]
+
+def _band(service: Dict[str, Any]) -> int:
+    return _BAND.get(str(service.get("price_band", "")).strip().lower(), 1)
+
+def bias_scores(sigs: Dict[str, Any], biases: List[Dict[str, Any]]) -> Dict[str, float]:
+    values = {k: float(v) for k, v in sigs.items() if isinstance(v, (int, float))}
+    mean = sum(values.values()) / len(values) if values else 0.5
+    out = {}
+    for b in biases:
+        weights = BIAS_SIGNALS.get(b.get("key", ""))
+        out[b.get("key", "")] = sum(w * values.get(s, 0.5) for s, w in weights.items()) if weights else mean
+    return out
+
+def _links(services: List[Dict[str, Any]], biases: List[Dict[str, Any]]) -> Dict[str, set]:
+    # service_id -> bias keys, from both directions of the compatibility graph
+    links: Dict[str, set] = {s.get("service_id", ""): {str(k).lower() for k in s.get("compatible_biases") or []}
+                             for s in services}
+    for b in biases:
+        for sid in b.get("compatible_services") or []:
+            if sid in links:
+                links[sid].add(b.get("key", ""))
+    return links
+
+def _why(key: str, sigs: Dict[str, Any]) -> str:
+    weights = BIAS_SIGNALS.get(key)
+    if not weights:
+        return "Fits the listing's overall profile."
+    top = max(weights, key=lambda s: weights[s] * float(sigs.get(s, 0.5) or 0))
+    return f"Driven by {top} ({float(sigs.get(top, 0.5) or 0):.2f})."
+
+def plan(answers: Dict[str, Any], sigs: Dict[str, Any], snap) -> Optional[Dict[str, Any]]:
+    """High/Medium/Low stacks and the top-3 bias mini-plans in the _Decision shape, built from the
+    KB snapshot alone, or None when it has no services. Services the snapshot's guardrails would
+    drop for these answers are never proposed."""
+    allowed = snap.rules.allows(answers)
+    services = [s for s in snap.services if s.get("service_id") and allowed(s["service_id"])]
+    if not services:
+        return None
+    bscore = bias_scores(sigs, snap.biases)
+    links = _links(services, snap.biases)
+    bias_by_key = {b.get("key"): b for b in snap.biases}
+
+    def fit(s: Dict[str, Any]) -> float:
+        linked = [bscore[k] for k in links[s["service_id"]] if k in bscore]
+        return sum(linked) / len(linked) if linked else 0.0
+
+    base = {s["service_id"]: fit(s) for s in services}
+    stacks = []
+    for tier, max_band, size, band_w in TIERS:
+        pool = [s for s in services if _band(s) <= max_band]
+        if not pool:
+            # nothing this cheap in the catalog: rank the cheapest band it does have instead
+            cheapest = min(_band(s) for s in services)
+            pool = [s for s in services if _band(s) == cheapest]
+        ranked = sorted(pool, key=lambda s: (-(base[s["service_id"]] + band_w * _band(s)), s["service_id"]))[:size]
+        stacks.append({"tier": tier, "rationale": _TIER_RATIONALE[tier], "services": [
+            {"service_id": s["service_id"], "name": s.get("name", s["service_id"]),
+             "rationale": _service_rationale(s, links, bias_by_key, bscore)} for s in ranked]})
+
+    chosen = {s["service_id"] for st in stacks[:2] for s in st["services"]}
+
+    def bias_rank(b: Dict[str, Any]) -> Tuple[float, str]:
+        support = sum(1 for sid in chosen if b.get("key") in links.get(sid, ()))
+        return (-(bscore.get(b.get("key", ""), 0.0) + 0.1 * support), b.get("key", ""))
+    biases = []
+    for b in sorted(snap.biases, key=bias_rank)[:3]:
+        bullets = [*(b.get("copy_patterns") or []), *(b.get("cadence_patterns") or [])][:3]
+        bullets += _GENERIC_BULLETS[:max(0, 2 - len(bullets))]
+        biases.append({"key": b.get("key", ""), "name": b.get("name", b.get("key", "")),
+                       "definition": b.get("definition", ""), "why": _why(b.get("key", ""), sigs),
+                       "executionBullets": bullets})
+    return {"stacks": stacks, "biases": biases}
+
+def _service_rationale(s, links, bias_by_key, bscore) -> str:
+    keys = sorted((k for k in links[s["service_id"]] if k in bias_by_key), key=lambda k: (-bscore[k], k))[:2]
+    if not keys:
+        return f"{_BAND_NAMES[_band(s)]}-band coverage."
+    return "Supports " + " and ".join(bias_by_key[k].get("name", k) for k in keys) + "."
@@ -0,0 +1,68 @@
+import json, math
+from typing import Any, Dict, List, Optional
+from app.config import settings
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+# Fields of retrieved KB records the model actually reads. Constraints, price bands and SKUs are
+# applied after the model answers (guardrails, price index), so they never go into a prompt.
+CONTEXT_FIELDS = {
+    "services": ("service_id", "name", "deliverables", "compatible_biases"),
+    "biases": ("key", "name", "definition", "copy_patterns", "cadence_patterns"),
+}
+# per-service fields of a stack echoed back to the model (drafts, the chosen stack)
+STACK_SERVICE_FIELDS = ("service_id", "name", "rationale")
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: tiktoken's o200k_base when installed, else ~4 chars per token."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+def _prune(v: Any) -> Any:
+    # None, empty strings and empty containers carry no information for the model
+    if isinstance(v, dict):
+        out = {k: _prune(x) for k, x in v.items()}
+        return {k: x for k, x in out.items() if x not in (None, "", [], {})}
+    if isinstance(v, (list, tuple)):
+        return [_prune(x) for x in v]
+    return v
+
+def dumps(obj: Any) -> str:
+    """Compact canonical JSON: sorted keys, no whitespace, UTF-8 kept as-is, empty values dropped."""
+    return json.dumps(_prune(obj), sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def _pick(record: Dict[str, Any], fields) -> Dict[str, Any]:
+    return {f: record[f] for f in fields if f in record}
+
+def stack(st: Dict[str, Any]) -> Dict[str, Any]:
+    return {"tier": st.get("tier"), "rationale": st.get("rationale"),
+            "services": [_pick(s, STACK_SERVICE_FIELDS) for s in st.get("services", [])]}
+
+def context(ctx: Dict[str, List[Dict[str, Any]]], budget_tokens: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Retrieved services/biases reduced to CONTEXT_FIELDS and trimmed to budget_tokens
+    (default LLM_CONTEXT_TOKEN_BUDGET).
+
+    Each list arrives best-first from retrieve_context; records are taken alternately from the
+    two lists in rank order, and a record that would overrun the budget is skipped."""
+    budget = settings.LLM_CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    lists = {k: [_pick(r, fields) for r in ctx.get(k, [])] for k, fields in CONTEXT_FIELDS.items()}
+    out: Dict[str, List[Dict[str, Any]]] = {k: [] for k in lists}
+    used = 0
+    for rank in range(max((len(v) for v in lists.values()), default=0)):
+        for k, records in lists.items():
+            if rank >= len(records):
+                continue
+            cost = count_tokens(dumps(records[rank])) + 1
+            if used + cost <= budget:
+                out[k].append(records[rank])
+                used += cost
+    return out
@@ -0,0 +1,121 @@
+import json, logging, os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+# The shipped rule set lives in data/rules.json (the single source of truth); it is the default
+# for a DATA_DIR without its own rules.json. Conditions are evaluated against the intake answers:
+#   {"field": f, "eq": v} | {"field": f, "in": [..]} | {"field": f, "truthy": bool}
+#   {"any": [..]} | {"all": [..]} | {"not": cond}
+# "constraints" names conditions that catalog services can list in their `constraints`;
+# "require" attaches constraints to services by id on top of the catalog's own;
+# "ensure" inserts a service at the front of every stack that lacks it when "when" holds.
+PACKAGED_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "rules.json")
+
+def _read_spec(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read() or b"{}")
+    except FileNotFoundError:
+        return None
+
+@lru_cache(maxsize=1)
+def default_spec() -> Dict[str, Any]:
+    spec = _read_spec(PACKAGED_RULES)
+    if spec is None:
+        log.warning("%s is missing; running without guardrails", PACKAGED_RULES)
+        return {}
+    return spec
+
+def _compile(cond: Dict[str, Any]) -> Predicate:
+    if "any" in cond:
+        parts = [_compile(c) for c in cond["any"]]
+        return lambda a: any(p(a) for p in parts)
+    if "all" in cond:
+        parts = [_compile(c) for c in cond["all"]]
+        return lambda a: all(p(a) for p in parts)
+    if "not" in cond:
+        inner = _compile(cond["not"])
+        return lambda a: not inner(a)
+    field = cond["field"]
+    if "eq" in cond:
+        v = cond["eq"]
+        return lambda a: a.get(field) == v
+    if "in" in cond:
+        vs = list(cond["in"])
+        return lambda a: a.get(field) in vs
+    want = bool(cond.get("truthy", True))
+    return lambda a: bool(a.get(field)) is want
+
+@dataclass(frozen=True)
+class Rules:
+    """Guardrails compiled for one KB version.
+
+    require maps service_id -> names of the constraints it needs; each constraint is compiled
+    once and evaluated at most once per intake, so pruning a stack is a dict lookup per service
+    however large the catalog is."""
+    predicates: Dict[str, Predicate]
+    require: Dict[str, Tuple[str, ...]]
+    ensure: Tuple[Tuple[Predicate, Dict[str, Any]], ...]
+
+    def allows(self, answers: Dict[str, Any]) -> Callable[[str], bool]:
+        """service_id -> whether the intake meets that service's constraints (memoised per call)."""
+        memo: Dict[str, bool] = {}
+
+        def ok(service_id: str) -> bool:
+            for name in self.require.get(service_id, ()):
+                if name not in memo:
+                    memo[name] = self.predicates[name](answers)
+                if not memo[name]:
+                    return False
+            return True
+        return ok
+
+    def _ensured(self, answers: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [svc for when, svc in self.ensure if when(answers)]
+
+    def apply(self, answers: Dict[str, Any], services: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.apply_stacks(answers, [services])[0]
+
+    def apply_stacks(self, answers: Dict[str, Any],
+                     stacks: Iterable[Sequence[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """Prune and top up every stack's services for one intake in a single pass."""
+        ok, ensured = self.allows(answers), self._ensured(answers)
+        out = []
+        for services in stacks:
+            kept = [s for s in services if ok(s.get("service_id", ""))]
+            have = {s.get("service_id") for s in kept}
+            for svc in ensured:
+                if svc["service_id"] not in have:
+                    kept.insert(0, dict(svc))
+                    have.add(svc["service_id"])
+            out.append(kept)
+        return out
+
+    def apply_batch(self, items: Iterable[Tuple[Dict[str, Any], Iterable[Sequence[Dict[str, Any]]]]]
+                    ) -> List[List[List[Dict[str, Any]]]]:
+        """apply_stacks for many (answers, stacks) intakes against the same compiled rules."""
+        return [self.apply_stacks(answers, stacks) for answers, stacks in items]
+
+def load_spec(data_dir: str) -> Dict[str, Any]:
+    spec = _read_spec(os.path.join(data_dir, "rules.json"))
+    return default_spec() if spec is None else spec
+
+def compile_rules(spec: Dict[str, Any], services: Iterable[Dict[str, Any]]) -> Rules:
+    """Compile a rules spec plus the catalog's per-service `constraints` into a Rules table.
+    Constraint names the spec doesn't define (free-text notes from the catalog) are skipped."""
+    predicates = {name: _compile(cond) for name, cond in spec.get("constraints", {}).items()}
+    require: Dict[str, List[str]] = {sid: list(names) for sid, names in spec.get("require", {}).items()}
+    for s in services:
+        own = require.setdefault(s.get("service_id", ""), [])
+        own += [name for name in s.get("constraints") or [] if name in predicates and name not in own]
+    unknown = {n for names in require.values() for n in names if n not in predicates}
+    if unknown:
+        log.warning("rules reference undefined constraints: %s", ", ".join(sorted(unknown)))
+    return Rules(predicates=predicates,
+                 require={sid: tuple(n for n in names if n in predicates) for sid, names in require.items() if names},
+                 ensure=tuple((_compile(r["when"]), dict(r["service"])) for r in spec.get("ensure", [])))
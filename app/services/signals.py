@@ -1,3 +1,13 @@
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence
+import numpy as np
+
+CONDITION = {"pristine":0.2,"updated":0.4,"average":0.5,"dated":0.7,"needs_work":0.9}
+NATURAL = {"excellent":0.2,"good":0.4,"mixed":0.6,"poor":0.8}
+TIMELINE = {"low":0.3,"medium":0.5,"high":0.7,"urgent":0.9,
+            "speed":0.9,"balance":0.6,"maximize_price":0.4}
+
+FIELDS = ("complexity", "clarityNeed", "momentumPressure", "brandLift", "locationEfficiency")
+
 def compute(answers: dict) -> dict:
     size = float(answers.get("interiorSizeSqft", 1500))
     condition = answers.get("conditionBand", "average")
@@ -5,20 +15,10 @@ def compute(answers: dict) -> dict:
     natural = answers.get("naturalLight", "good")
     timeline = answers.get("timelinePressure", answers.get("priority", "medium"))
 
-    def map_condition(c):
-        m = {"pristine":0.2,"updated":0.4,"average":0.5,"dated":0.7,"needs_work":0.9}
-        return m.get(c,0.5)
-    def map_natural(n):
-        m = {"excellent":0.2,"good":0.4,"mixed":0.6,"poor":0.8}
-        return m.get(n,0.5)
-    def map_timeline(t):
-        m = {"low":0.3,"medium":0.5,"high":0.7,"urgent":0.9,
-             "speed":0.9,"balance":0.6,"maximize_price":0.4}
-        return m.get(t,0.5)
-
-    complexity = 0.3*map_condition(condition) + 0.2*(1.0-map_natural(natural)) + 0.2*(1.0 if tight else 0) + 0.3*(size/4000.0)
-    clarity_need = 0.6*map_condition(condition) + 0.4*(1.0 if tight else 0.0)
-    momentum = map_timeline(timeline)
+    c = CONDITION.get(condition, 0.5)
+    complexity = 0.3*c + 0.2*(1.0-NATURAL.get(natural, 0.5)) + 0.2*(1.0 if tight else 0) + 0.3*(size/4000.0)
+    clarity_need = 0.6*c + 0.4*(1.0 if tight else 0.0)
+    momentum = TIMELINE.get(timeline, 0.5)
     brand_lift = 0.2 + (size/5000.0) + (0.2 if answers.get("propertyType")=="Luxury" else 0.0)
     location_eff = 0.5
 
@@ -29,3 +29,90 @@ def compute(answers: dict) -> dict:
         "brandLift": round(min(1.0, brand_lift), 3),
         "locationEfficiency": round(min(1.0, location_eff), 3),
     }
+
+# ---------- batch ----------
+# Columns are answer fields; a None entry (or a missing column) means the answer was absent.
+
+def _present(v: Any) -> Any:
+    # an answer given as null matches no lookup key in compute(); "" does the same here
+    return "" if v is None else v
+
+def columns(rows: Iterable[Mapping[str, Any]]) -> Dict[str, list]:
+    """Columnar input for compute_batch from answers dicts, keeping compute()'s defaulting rules."""
+    rows = list(rows)
+    return {
+        "interiorSizeSqft": [a.get("interiorSizeSqft", 1500) for a in rows],
+        "conditionBand": [_present(a.get("conditionBand", "average")) for a in rows],
+        "tightRooms": [a.get("tightRooms", False) for a in rows],
+        "naturalLight": [_present(a.get("naturalLight", "good")) for a in rows],
+        "timelinePressure": [_present(a.get("timelinePressure", a.get("priority", "medium"))) for a in rows],
+        "propertyType": [a.get("propertyType") for a in rows],
+    }
+
+def _object(col: Any, n: int, default: Any) -> np.ndarray:
+    if col is None:
+        return np.full(n, default, dtype=object)
+    if isinstance(col, np.ndarray) and col.dtype.kind in "biufU":
+        return col  # typed arrays can't hold None; compared natively, no per-element Python calls
+    a = np.asarray(col, dtype=object)
+    return np.where(a == None, default, a)  # noqa: E711
+
+def _lookup(col: Any, n: int, default: str, table: Dict[str, float]) -> np.ndarray:
+    a = _object(col, n, default)
+    out = np.full(n, 0.5)
+    for k, v in table.items():
+        out[a == k] = v
+    return out
+
+def _cap(x: np.ndarray) -> np.ndarray:
+    # min(1.0, x) exactly, NaN included (min keeps 1.0 unless x < 1.0)
+    return np.where(x < 1.0, x, 1.0)
+
+def _round3(x: np.ndarray) -> np.ndarray:
+    """round(x, 3) for every element, bit-for-bit.
+
+    rint(x*1000)/1000 is the correctly rounded result except where x*1000 lands next to a .5
+    tie (or is too large for the product's error to stay below that margin); those few are
+    handed to Python's round()."""
+    scaled = x * 1000.0
+    out = np.rint(scaled) / 1000.0
+    with np.errstate(invalid="ignore"):
+        near = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | ~(np.abs(x) < 1e6)
+    if near.any():
+        out[near] = [round(float(v), 3) for v in x[near]]
+    return out
+
+def compute_batch(cols: Mapping[str, Optional[Sequence[Any]]], n: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Vectorised compute(): same five signals as float64 arrays, identical to compute() per row.
+
+    cols maps answer fields (interiorSizeSqft, conditionBand, tightRooms, naturalLight,
+    timelinePressure, priority, propertyType) to lists or arrays of equal length."""
+    if n is None:
+        n = len(next(v for v in cols.values() if v is not None))
+    size_col = cols.get("interiorSizeSqft")
+    if isinstance(size_col, np.ndarray) and size_col.dtype.kind in "iuf":
+        size = size_col.astype(np.float64)
+    else:
+        size = _object(size_col, n, 1500).astype(np.float64)
+    tight = _object(cols.get("tightRooms"), n, False)
+    tight = (tight.astype(object) if tight.dtype.kind == "U" else tight).astype(bool)  # str truthiness
+    timeline = _object(cols.get("timelinePressure"), n, None)
+    if cols.get("priority") is not None and timeline.dtype == object:
+        timeline = np.where(timeline == None, _object(cols["priority"], n, None), timeline)  # noqa: E711
+    luxury = _object(cols.get("propertyType"), n, None) == "Luxury"
+
+    c = _lookup(cols.get("conditionBand"), n, "average", CONDITION)
+    natural = _lookup(cols.get("naturalLight"), n, "good", NATURAL)
+    tight_f = np.where(tight, 1.0, 0.0)
+    complexity = 0.3*c + 0.2*(1.0-natural) + 0.2*tight_f + 0.3*(size/4000.0)
+    clarity_need = 0.6*c + 0.4*tight_f
+    momentum = _lookup(timeline, n, "medium", TIMELINE)
+    brand_lift = 0.2 + (size/5000.0) + np.where(luxury, 0.2, 0.0)
+
+    return {
+        "complexity": _round3(_cap(complexity)),
+        "clarityNeed": _round3(_cap(clarity_need)),
+        "momentumPressure": _round3(_cap(momentum)),
+        "brandLift": _round3(_cap(brand_lift)),
+        "locationEfficiency": np.full(n, 0.5),
+    }
@@ -0,0 +1,105 @@
+"""Per-export .docx render time and peak allocation, legacy builder vs the template renderer.
+
+    python -m benchmarks.bench_docx [iterations]
+"""
+import glob, io, json, sys, time, tracemalloc
+from docx import Document
+from app.models import Intake
+from app.services import copywriter, export_docx, llm_decider
+
+def legacy_render(intake, copy_pack, chosen_tier, chosen_bias):
+    """The pre-template builder (the original build_doc minus the save): blank Document() and one
+    add_heading/add_paragraph per element."""
+    doc = Document()
+    _h = lambda text, lvl=1: doc.add_heading(text, level=lvl)
+    _p = lambda text: doc.add_paragraph(text)
+    def _bullets(items):
+        for it in items: doc.add_paragraph(it, style="List Bullet")
+    _h("Proposal + Listing Lingo Pack", 0)
+    _p(f"Mode: Deep Dive | Intake ID: {intake.id}")
+    _p(f"Chosen Tier: {chosen_tier} | Bias Plan: {chosen_bias}")
+    _h("Chosen Services & Why", 1)
+    stack = next(s for s in intake.stacks if s["tier"].lower()==chosen_tier.lower())
+    for s in stack["services"]:
+        _h(s["name"], 2)
+        _p(s.get("rationale",""))
+
+    _h("I. Core Listing & Print", 1)
+    cp = copy_pack.get("core_listing_print", {})
+    for k,v in cp.items():
+        _h(k, 2)
+        if isinstance(v, list): _bullets(v)
+        elif isinstance(v, dict):
+            for sk,sv in v.items():
+                _h(sk, 3)
+                if isinstance(sv, list): _bullets(sv)
+                elif isinstance(sv, dict):
+                    for ssk, ssv in sv.items():
+                        _h(ssk, 4)
+                        if isinstance(ssv, list): _bullets(ssv)
+                        else: _p(str(ssv))
+                else: _p(str(sv))
+        else: _p(str(v))
+
+    for title, key in (("II. Digital & Social", "digital_social"), ("III. Direct Outreach", "direct_outreach")):
+        _h(title, 1)
+        for k,v in copy_pack.get(key, {}).items():
+            _h(k, 2)
+            if isinstance(v, list): _bullets(v)
+            elif isinstance(v, dict):
+                for sk,sv in v.items():
+                    _h(sk, 3)
+                    if isinstance(sv, list): _bullets(sv)
+                    else: _p(str(sv))
+            else: _p(str(v))
+
+    _h("Phase I/II & Week-1 Cadence", 1)
+    cadence = copy_pack.get("cadence", {"Phase I": ["Morning 9–11a","Lunch 12–2p","Evening 5–8p"],
+                                        "Phase II": ["Morning 9–11a","Lunch 12–2p","Evening 5–8p"]})
+    for k,v in cadence.items():
+        _h(k, 2); _bullets(v)
+
+    _h("Operational Checklists", 1)
+    for k,v in copy_pack.get("ops_checklists", {}).items():
+        _h(k, 2)
+        _bullets(v if isinstance(v,list) else [str(v)])
+
+    _h("KPIs (Simple)", 1)
+    _bullets(copy_pack.get("kpis", ["CTR on listing page", "Video completion rate", "Inquiry response time"]))
+
+    _h("Disclaimers", 1)
+    for k,v in copy_pack.get("disclaimers", {}).items():
+        _h(k.replace("_"," ").title(), 2)
+        _p(v)
+    return doc
+
+def _intakes():
+    dec = llm_decider._offline_decision()
+    for path in sorted(glob.glob("fixtures/*.json")):
+        with open(path) as f:
+            answers = json.load(f)["answers"]
+        yield path, Intake(id=path, mode="deep_dive", answers=answers, signals={},
+                           stacks=dec["stacks"], biases=dec["biases"])
+
+def _measure(fn, n):
+    fn()  # warm caches (template bytes, style lookups)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn().save(io.BytesIO())
+    per = (time.perf_counter() - t0) / n
+    tracemalloc.start()
+    fn().save(io.BytesIO())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return per, peak
+
+def main(n: int = 50):
+    pack = copywriter._offline_pack()
+    for path, intake in _intakes():
+        old = _measure(lambda: legacy_render(intake, pack, "High", "fluency"), n)
+        new = _measure(lambda: export_docx.render(export_docx.proposal_paragraphs(intake, pack, "High", "fluency")), n)
+        print(f"{path}: legacy {old[0]*1000:.2f}ms peak {old[1]/1024:.0f}KiB | "
+              f"template {new[0]*1000:.2f}ms peak {new[1]/1024:.0f}KiB")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
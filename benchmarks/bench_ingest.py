@@ -0,0 +1,55 @@
+"""KB ingest time and peak allocation, python-docx object model vs the streaming iterparse path.
+
+    python -m benchmarks.bench_ingest [services] [image_kb]
+
+Builds a synthetic catalog .docx with one embedded image per service (the real catalog is
+image-heavy) and parses it both ways.
+"""
+import io, os, sys, tempfile, time, tracemalloc, zlib, struct
+from docx import Document
+from app.services import ingest_docx
+
+def _png(kb: int) -> bytes:
+    # incompressible RGB noise so the image really is ~kb on disk
+    w = h = max(8, int((kb * 1024 / 3) ** 0.5))
+    raw = b"".join(b"\x00" + os.urandom(w * 3) for _ in range(h))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+def make_catalog(path: str, n: int, image_kb: int):
+    doc = Document()
+    for i in range(n):
+        doc.add_heading(f"Service {i}", 1)
+        doc.add_paragraph("- Deliverable one")
+        doc.add_paragraph("- Deliverable two")
+        doc.add_paragraph("Constraints: lead time 48h; weather dependent")
+        doc.add_paragraph("Price: $$")
+        doc.add_paragraph("Biases: anchoring, scarcity")
+        doc.add_picture(io.BytesIO(_png(image_kb)))
+    doc.save(path)
+
+def measure(fn, path):
+    t0 = time.perf_counter()
+    out = fn(path)
+    dt = time.perf_counter() - t0  # timed without tracemalloc, which slows python-docx badly
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, dt, peak
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    image_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "catalog.docx")
+        make_catalog(path, n, image_kb)
+        print(f"{n} services, {os.path.getsize(path) / 1e6:.1f} MB .docx")
+        legacy, t_legacy, m_legacy = measure(ingest_docx._parse_services_docx, path)
+        stream, t_stream, m_stream = measure(ingest_docx.parse_services, path)
+        assert legacy == stream
+        print(f"python-docx: {t_legacy * 1000:8.1f} ms  peak {m_legacy / 1e6:6.1f} MB")
+        print(f"iterparse:   {t_stream * 1000:8.1f} ms  peak {m_stream / 1e6:6.1f} MB")
@@ -0,0 +1,32 @@
+"""Retrieval benchmark on a synthetic catalog.
+
+    python -m benchmarks.bench_retrieval [n_items]
+"""
+import random, sys, time
+from app.services.bm25 import BM25Index, service_text, query_text
+
+WORDS = ("hero aerial drone twilight tour floor plan schematic staging vacant video reel walkthrough "
+         "photo snaps quick luxury condo sfr townhome kitchen view skyline remote buyer clarity "
+         "social email flyer brochure feature sheet signage print website ads retouch sky grass").split()
+
+def synthetic_catalog(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [{"service_id": f"svc_{i}", "name": " ".join(rnd.sample(WORDS, 2)).title(),
+             "deliverables": [" ".join(rnd.sample(WORDS, 4)) for _ in range(3)]} for i in range(n)]
+
+def main(n: int = 10_000, queries: int = 500):
+    services = synthetic_catalog(n)
+    t0 = time.perf_counter()
+    idx = BM25Index(service_text(s) for s in services)
+    build = time.perf_counter() - t0
+    answers = {"propertyType": "Condo", "tightRooms": True, "naturalLight": "good", "likelyBuyer": "remote_buyer",
+               "locationPerk": "walkable", "signatureFeature": "Top-floor skyline peek", "occupancy": "vacant"}
+    q = query_text(answers)
+    t0 = time.perf_counter()
+    for _ in range(queries):
+        idx.top(q, 8)
+    per = (time.perf_counter() - t0) / queries
+    print(f"items={n} build={build*1000:.1f}ms query={per*1e6:.0f}us top3={[services[i]['name'] for i,_ in idx.top(q, 3)]}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
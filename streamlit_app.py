@@ -1,4 +1,4 @@
-import os, json, math, io, base64
+import os, json, io, base64
 from pathlib import Path
 from typing import List, Dict, Any
 import streamlit as st
@@ -113,71 +113,38 @@ def load_kb() -> Dict[str, Any]:
 KB = load_kb()
 
 # ---------- Simple retriever ----------
-def _bofe(text: str) -> Dict[str,float]:
-    words = [w.lower() for w in text.split()]
-    vec={} 
-    for w in words: vec[w]=vec.get(w,0)+1
-    return vec
+from app.services.bm25 import BM25Index, service_text, bias_text, query_text
 
-def _cos(a:Dict[str,float], b:Dict[str,float])->float:
-    dot = sum(a.get(k,0)*b.get(k,0) for k in set(a)|set(b))
-    na = math.sqrt(sum(v*v for v in a.values())) or 1.0
-    nb = math.sqrt(sum(v*v for v in b.values())) or 1.0
-    return dot/(na*nb)
+def build_index(kb: Dict[str,Any]) -> Dict[str,BM25Index]:
+    return {"services": BM25Index(service_text(s) for s in kb["services"]),
+            "biases": BM25Index(bias_text(b) for b in kb["biases"])}
+
+KB_INDEX = build_index(KB)
 
 def retrieve_context(answers: dict, k:int=6) -> Dict[str,Any]:
-    q = " ".join([f"{k}:{v}" for k,v in answers.items() if isinstance(v,(str,int,float))])
-    qv = _bofe(q or "query")
-    s = sorted([(s, _cos(qv,_bofe(s["name"]+" "+" ".join(s.get("deliverables",[]))))) for s in KB["services"]],
-               key=lambda x:x[1], reverse=True)[:k]
-    b = sorted([(b, _cos(qv,_bofe(b["name"]+" "+b.get("definition","")+" "+" ".join(b.get("copy_patterns",[]))))) for b in KB["biases"]],
-               key=lambda x:x[1], reverse=True)[:k]
-    return {"services":[x[0] for x in s], "biases":[x[0] for x in b]}
+    q = query_text(answers) or "query"
+    s = KB_INDEX["services"].top(q, k)
+    b = KB_INDEX["biases"].top(q, k)
+    return {"services":[KB["services"][i] for i,_ in s], "biases":[KB["biases"][i] for i,_ in b]}
 
 # ---------- Signals ----------
-def signals(answers: dict) -> dict:
-    size = float(answers.get("interiorSizeSqft", 1500))
-    condition = answers.get("conditionBand","average")
-    tight = bool(answers.get("tightRooms",False))
-    natural = answers.get("naturalLight","good")
-    timeline = answers.get("timelinePressure", answers.get("priority","medium"))
-    def map_condition(c): return {"pristine":0.2,"updated":0.4,"average":0.5,"dated":0.7,"needs_work":0.9}.get(c,0.5)
-    def map_natural(n):  return {"excellent":0.2,"good":0.4,"mixed":0.6,"poor":0.8}.get(n,0.5)
-    def map_timeline(t): return {"low":0.3,"medium":0.5,"high":0.7,"urgent":0.9,"speed":0.9,"balance":0.6,"maximize_price":0.4}.get(t,0.5)
-    complexity = 0.3*map_condition(condition)+0.2*(1-map_natural(natural))+0.2*(1 if tight else 0)+0.3*(size/4000)
-    clarity = 0.6*map_condition(condition)+0.4*(1 if tight else 0)
-    momentum = map_timeline(timeline)
-    brand = 0.2 + (size/5000.0) + (0.2 if answers.get("propertyType")=="Luxury" else 0.0)
-    return {
-        "complexity": round(min(1.0, complexity),3),
-        "clarityNeed": round(min(1.0, clarity),3),
-        "momentumPressure": round(min(1.0, momentum),3),
-        "brandLift": round(min(1.0, brand),3),
-        "locationEfficiency": 0.5,
-    }
+from app.services.signals import compute as signals
 
 # ---------- Guardrails ----------
-def enforce_guardrails(answers: dict, services: List[Dict[str,Any]]) -> List[Dict[str,Any]]:
-    out = []
-    vacant = answers.get("occupancy") == "vacant"
-    tight = bool(answers.get("tightRooms"))
-    remote = answers.get("likelyBuyer") == "remote_buyer"
-    for s in services:
-        sid = s.get("service_id","")
-        if sid == "virtual_staging" and not vacant and not answers.get("explicitVirtualStagingOK", False):
-            continue
-        out.append(s)
-    if tight and all(s.get("service_id")!="2d_floor_plan" for s in out):
-        out.insert(0, {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Adds schematic clarity for tight rooms."})
-    if remote and all(s.get("service_id")!="zillow_3d" for s in out):
-        out.insert(0, {"service_id":"zillow_3d","name":"Zillow 3D","rationale":"Remote buyers need tour continuity."})
-    return out
+from app.services import rules as guardrails
+
+RULES = guardrails.compile_rules(guardrails.load_spec(str(DATA_DIR)), KB["services"])
 
 # ---------- LLM helpers ----------
+@st.cache_resource
+def openai_client(key: str):
+    # one pooled client per API key for the whole Streamlit server, not one per click
+    return OpenAI(api_key=key)
+
 def llm_decide(answers: dict, sigs: dict, ctx: dict) -> Dict[str,Any]:
     if OPENAI_OK and (os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY")):
         key = os.getenv("OPENAI_API_KEY", st.secrets.get("OPENAI_API_KEY"))
-        client = OpenAI(api_key=key)
+        client = openai_client(key)
         sys = ("You are a neutral listing production planner. "
                "Compliance: schools/safety factual only; post-production limited to non-material removals + sky/grass. "
                "Return JSON with 3 stacks (High/Medium/Low) and 3 biases (key,name,definition,why,executionBullets 2–3 items).")
@@ -215,18 +182,17 @@ def llm_decide(answers: dict, sigs: dict, ctx: dict) -> Dict[str,Any]:
                  "executionBullets":["Hero-first","Frame comparisons"]}
             ]
         }
-    # apply guardrails to each stack
-    stacks=[]
-    for stk in data["stacks"]:
-        pruned = enforce_guardrails(answers, stk["services"])
-        stacks.append({"tier":stk["tier"], "services":pruned, "rationale":stk.get("rationale","")})
+    # apply guardrails to all stacks in one pass
+    guarded = RULES.apply_stacks(answers, [stk["services"] for stk in data["stacks"]])
+    stacks = [{"tier":stk["tier"], "services":pruned, "rationale":stk.get("rationale","")}
+              for stk, pruned in zip(data["stacks"], guarded)]
     return {"stacks":stacks, "biases":data["biases"]}
 
 def llm_copy(intake: dict, chosen_stack: dict, chosen_bias: dict, ctx: dict) -> Dict[str,Any]:
     # Same pattern: real LLM if key, otherwise deterministic text
     if OPENAI_OK and (os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY")):
         key = os.getenv("OPENAI_API_KEY", st.secrets.get("OPENAI_API_KEY"))
-        client = OpenAI(api_key=key)
+        client = openai_client(key)
         sys = ("You write neutral listing copy using the chosen bias. "
                "Compliance: schools/safety factual only; post-production limits. Return JSON sections exactly.")
         prompt = {"intake":intake,"chosen_stack":chosen_stack,"chosen_bias":chosen_bias,"kb_context":ctx}
@@ -269,52 +235,14 @@ def make_docx(filename: str, intake: dict, stacks: List[dict], bias_key: str, co
     if not Document:
         # simple text fallback zipped as .docx-like; but prefer python-docx installed
         return ("Install python-docx for Word export.\n"+json.dumps(copy_pack, indent=2)).encode("utf-8")
-    from docx import Document as D
-    doc = D()
-    def H(t,l=1): doc.add_heading(t, level=l)
-    def P(t): doc.add_paragraph(t)
-    def BL(lst): 
-        for it in lst: doc.add_paragraph(str(it), style="List Bullet")
-    H("Proposal + Listing Lingo Pack", 0)
-    P(f"Mode: Deep Dive")
-    P(f"Chosen Bias Plan: {bias_key}")
-    H("Stacks (High/Medium/Low)",1)
+    from app.services import export_docx
+    paras = [("Title","Proposal + Listing Lingo Pack"), (None,"Mode: Deep Dive"),
+             (None,f"Chosen Bias Plan: {bias_key}"), ("Heading1","Stacks (High/Medium/Low)")]
     for s in stacks:
-        H(f"{s['tier']}",2)
-        P(s.get("rationale",""))
+        paras += [("Heading2",s["tier"]), (None,s.get("rationale",""))]
         for it in s["services"]:
-            H(it["name"],3); P(it.get("rationale",""))
-    H("I. Core Listing & Print",1)
-    cp = copy_pack.get("core_listing_print",{})
-    for k,v in cp.items():
-        H(k,2)
-        if isinstance(v,list): BL(v)
-        elif isinstance(v,dict):
-            for sk,sv in v.items():
-                H(sk,3)
-                if isinstance(sv,list): BL(sv)
-                elif isinstance(sv,dict):
-                    for ssk,ssv in sv.items():
-                        H(ssk,4); BL(ssv if isinstance(ssv,list) else [ssv])
-                else: P(str(sv))
-        else: P(str(v))
-    H("II. Digital & Social",1)
-    ds = copy_pack.get("digital_social",{})
-    for k,v in ds.items():
-        H(k,2); BL(v if isinstance(v,list) else [v])
-    H("III. Direct Outreach",1)
-    do = copy_pack.get("direct_outreach",{})
-    for k,v in do.items():
-        H(k,2); BL(v if isinstance(v,list) else [v])
-    H("Phase I/II & Week-1 Cadence",1)
-    cad = copy_pack.get("cadence",{"Phase I":["Morning 9–11a","Lunch 12–2p","Evening 5–8p"],"Phase II":["Morning 9–11a","Lunch 12–2p","Evening 5–8p"]})
-    for k,v in cad.items(): H(k,2); BL(v)
-    H("Operational Checklists",1)
-    ops = copy_pack.get("ops_checklists",{})
-    for k,v in ops.items(): H(k,2); BL(v if isinstance(v,list) else [v])
-    H("KPIs",1); BL(copy_pack.get("kpis",["CTR","Video completion","Lead replies"]))
-    H("Disclaimers",1)
-    P("Schools/safety factual only (names, distances, links). Post-production limited to non-material removals + sky/grass.")
+            paras += [("Heading3",it["name"]), (None,it.get("rationale",""))]
+    doc = export_docx.render(paras + export_docx.pack_paragraphs(copy_pack))
     bio = io.BytesIO()
     doc.save(bio)
     return bio.getvalue()
@@ -334,6 +262,8 @@ with st.sidebar:
         DATA_DIR.joinpath("catalog.json").unlink(missing_ok=True)
         DATA_DIR.joinpath("biases.json").unlink(missing_ok=True)
         globals()["KB"] = load_kb()
+        globals()["KB_INDEX"] = build_index(KB)
+        globals()["RULES"] = guardrails.compile_rules(guardrails.load_spec(str(DATA_DIR)), KB["services"])
         st.success("KB rebuilt from uploaded DOCX files.")
 
 st.title("LaunchPad AI Decision Engine (Streamlit)")
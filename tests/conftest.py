@@ -30,6 +30,20 @@ def build_kb():
             ]}, f)
     yield
 
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """A configured API key and an LLM that hands the planner's draft straight back."""
+    from app.config import settings
+    from app.services import llm_decider
+    calls = []
+    async def echo(answers, sigs, ctx, draft):
+        calls.append(answers)
+        return draft
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_decider, "_call_llm", echo)
+    return calls
+
 @pytest.fixture
 def client():
-    return TestClient(app)
+    with TestClient(app) as c:
+        yield c
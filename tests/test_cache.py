@@ -0,0 +1,91 @@
+import asyncio
+from app.services.cache import SingleFlight, TTLCache, canonical_key
+from app.services import llm_decider, kb_store
+
+def test_canonical_key_ignores_order_and_whitespace():
+    assert canonical_key({"a":"x  y","b":1}) == canonical_key({"b":1,"a":" x y "})
+    assert canonical_key({"a":1}) != canonical_key({"a":2})
+
+def test_ttl_cache_lru_and_sqlite_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    c = TTLCache("t", maxsize=2, ttl_s=60, path=path)
+    c.set("a", {"v":1}); c.set("b", {"v":2}); c.set("c", {"v":3})
+    assert len(c._mem) == 2
+    # evicted from memory but still on disk
+    fresh = TTLCache("t", maxsize=2, ttl_s=60, path=path)
+    assert fresh.get("a") == {"v":1} and fresh.stats()["diskHits"] == 1
+    assert TTLCache("t", maxsize=2, ttl_s=-1).get("zzz") is None
+
+def test_ttl_cache_async_disk_tier_runs_off_the_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    threads = []
+    real = asyncio.to_thread
+    async def to_thread(fn, *a):
+        threads.append(fn.__name__)
+        return await real(fn, *a)
+    monkeypatch.setattr(asyncio, "to_thread", to_thread)
+    async def run():
+        c = TTLCache("t", maxsize=1, ttl_s=60, path=path)
+        await c.aset("a", [1]); await c.aset("b", [2])
+        assert await c.aget("b") == [2]  # memory hit stays on the loop
+        assert await c.aget("a") == [1] and await c.aget("zzz") is None
+        return c.stats()
+    stats = asyncio.run(run())
+    assert threads == ["_disk_set", "_disk_set", "_disk_get", "_disk_get"]
+    assert stats["diskHits"] == 1 and stats["misses"] == 1
+
+def test_decide_hits_cache_until_kb_version_changes(monkeypatch, fake_llm):
+    llm_decider.decision_cache.clear()
+    answers = {"propertyType":"Condo","tightRooms":True,"likelyBuyer":"remote_buyer"}
+    before = llm_decider.decision_cache.stats()
+    asyncio.run(llm_decider.decide(answers, {"complexity":0.5}, mode="lighting", refine=True))
+    asyncio.run(llm_decider.decide(dict(answers), {"complexity":0.5}, mode="lighting", refine=True))
+    after = llm_decider.decision_cache.stats()
+    assert after["hits"] - before["hits"] == 1 and after["misses"] - before["misses"] == 1
+    snap = kb_store.get_snapshot()
+    monkeypatch.setattr(kb_store, "_snapshot", snap.__class__(**{**snap.__dict__, "version": "other"}))
+    asyncio.run(llm_decider.decide(answers, {"complexity":0.5}, mode="lighting", refine=True))
+    assert llm_decider.decision_cache.stats()["misses"] - after["misses"] == 1
+
+def test_single_flight_shares_results_and_errors_without_poisoning():
+    sf, calls = SingleFlight("t"), []
+    async def work(fail=False):
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        if fail:
+            raise ValueError("boom")
+        return len(calls)
+    async def run():
+        first = asyncio.gather(*(sf.do("k", work) for _ in range(5)))
+        await asyncio.sleep(0)
+        assert sf.stats()["waiters"] == {"k": 5}
+        assert await first == [1] * 5
+        errs = await asyncio.gather(*(sf.do("k", lambda: work(True)) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in errs)
+        assert await sf.do("k", work) == 3
+    asyncio.run(run())
+    assert len(calls) == 3
+    assert sf.stats() == {"inflight": 0, "calls": 3, "shared": 6, "errors": 1, "waiters": {}}
+
+def test_identical_concurrent_decides_make_one_llm_call(monkeypatch, fake_llm):
+    llm_decider.decision_cache.clear()
+    calls = []
+    async def fake(answers, sigs, ctx, draft):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return draft
+    monkeypatch.setattr(llm_decider, "_call_llm", fake)
+    answers = {"propertyType":"Condo","conditionBand":"dated"}
+    async def run():
+        return await asyncio.gather(*(llm_decider.decide(dict(answers), {"complexity":0.6}, mode="lighting",
+                                                         refine=True) for _ in range(4)))
+    results = asyncio.run(run())
+    assert len(calls) == 1 and all(r == results[0] for r in results)
+
+def test_refine_without_api_key_is_the_planner_and_uncached(monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    llm_decider.decision_cache.clear()
+    out = asyncio.run(llm_decider.decide({"propertyType":"Condo"}, {"complexity":0.5}, mode="lighting", refine=True))
+    assert out["source"] == "planner" and not out["fallback"]
+    assert llm_decider.decision_cache.stats()["size"] == 0
@@ -0,0 +1,16 @@
+import pytest
+from sqlalchemy import text
+from app import deps
+
+def test_sqlite_engine_uses_wal_and_busy_timeout():
+    with deps.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == deps.settings.DB_BUSY_TIMEOUT_MS
+
+def test_init_db_is_idempotent_and_refuses_newer_schema(monkeypatch):
+    deps.init_db(); deps.init_db()
+    with deps.engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM schema_version")).scalar() == deps.SCHEMA_VERSION
+    monkeypatch.setattr(deps, "SCHEMA_VERSION", deps.SCHEMA_VERSION - 1)
+    with pytest.raises(RuntimeError):
+        deps.init_db()
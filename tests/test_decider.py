@@ -9,3 +9,182 @@ def test_tight_room_condo_remote(client):
     assert r.status_code==200
     flat_services = [s["service_id"] for st in js["stacks"] for s in st["services"]]
     assert "2d_floor_plan" in flat_services and "zillow_3d" in flat_services
+
+def test_lighting_stream_sse(client):
+    payload = {"answers":{"propertyType":"Condo","beds":1,"baths":1.0,"interiorSizeSqft":640,"conditionBand":"updated",
+                          "tightRooms":True,"naturalLight":"good","occupancy":"occupied","quirkyFlow":False,"signatureFeature":"Loft",
+                          "likelyBuyer":"remote_buyer","locationPerk":"walkable","timelinePressure":"medium","agentOnCamComfort":"medium","showingWindow":"morning"}}
+    r = client.post("/intake/lighting/stream", json=payload)
+    assert r.status_code==200 and r.headers["content-type"].startswith("text/event-stream")
+    events = [line[len("event: "):] for line in r.text.splitlines() if line.startswith("event: ")]
+    assert events[0]=="signals" and events[-1]=="done"
+    assert events.count("stack")==3 and events.count("bias")==3
+    for block in r.text.strip().split("\n\n"):
+        if block.startswith("event: stack"):
+            assert "2d_floor_plan" in block and "zillow_3d" in block
+
+def test_batch_ndjson_dedupes_and_reports_errors(client):
+    import json
+    condo = {"propertyType":"Condo","interiorSizeSqft":620,"tightRooms":True,"likelyBuyer":"remote_buyer"}
+    items = [{"answers":condo,"ref":"a"},{"answers":dict(condo),"ref":"a2"},{"answers":dict(condo),"ref":"b","mode":"deep_dive"},
+             {"answers":{"interiorSizeSqft":"huge"},"ref":"bad"},{"answers":{"propertyType":"SFR"},"ref":"c"}]
+    r = client.post("/intake/batch", json={"items":items})
+    assert r.status_code==200
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    summary = lines[-1]
+    # same answers in another mode are decided separately
+    assert summary["total"]==5 and summary["ok"]==4 and summary["errors"]==1 and summary["unique"]==3
+    by_ref = {l["ref"]:l for l in lines[:-1]}
+    assert not by_ref["bad"]["ok"] and by_ref["a"]["ok"] and by_ref["b"]["mode"]=="deep_dive"
+    # every id reported ok is already in the database
+    for ref in ("a", "a2", "b", "c"):
+        assert client.get(f"/intakes/{by_ref[ref]['intake_id']}/exports").status_code==200
+
+def test_batch_reports_failed_commit_as_errors(client, monkeypatch):
+    import json
+    from app.routers import intake
+    def locked(*rows):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(intake, "save", locked)
+    r = client.post("/intake/batch", json={"items":[{"answers":{"propertyType":"Condo"},"ref":"x"}]})
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert not lines[0]["ok"] and "locked" in lines[0]["error"] and lines[-1]["ok"]==0
+
+def test_planner_builds_decision_locally():
+    import asyncio, time
+    from app.services import kb_store, llm_decider, planner, signals
+    answers = {"propertyType":"Condo","interiorSizeSqft":620,"tightRooms":True,"likelyBuyer":"remote_buyer",
+               "occupancy":"occupied","conditionBand":"dated"}
+    sigs = signals.compute(answers)
+    snap = kb_store.get_snapshot()
+    t0 = time.perf_counter()
+    draft = planner.plan(answers, sigs, snap)
+    assert time.perf_counter() - t0 < 0.05
+    llm_decider._Decision.model_validate(draft)
+    assert [st["tier"] for st in draft["stacks"]] == ["High", "Medium", "Low"] and len(draft["biases"]) == 3
+    assert draft["biases"][0]["key"] == "fluency"  # clarityNeed dominates for a dated, tight condo
+    assert all(s["service_id"] != "virtual_staging" for st in draft["stacks"] for s in st["services"])
+    assert planner.plan(answers, sigs, snap) == draft
+    out = asyncio.run(llm_decider.decide(answers, sigs, "lighting"))
+    assert out["source"] == "planner" and not out["fallback"]
+    assert out["stacks"][0]["services"][0]["service_id"] == "zillow_3d"  # guardrails still applied
+
+def test_prompt_is_compact_json_within_context_budget(monkeypatch):
+    import json
+    from app.config import settings
+    from app.services import llm_decider, prompts
+    services = [{"service_id": f"s{i}", "name": f"S{i}", "deliverables": ["x " * 40], "constraints": ["vacant_only"],
+                 "price_band": "high", "compatible_biases": ["fluency"]} for i in range(8)]
+    biases = [{"key": f"b{i}", "name": f"B{i}", "definition": "d", "copy_patterns": ["p"], "compatible_services": ["s0"]}
+              for i in range(8)]
+    monkeypatch.setattr(settings, "LLM_CONTEXT_TOKEN_BUDGET", 120)
+    draft = {"stacks": [{"tier": "High", "rationale": "r", "services": [{"service_id": "s0", "name": "S0",
+                                                                         "rationale": "r", "list_price": 9.0}]}],
+             "biases": []}
+    text = llm_decider._prompt({"a": 1, "b": None}, {"complexity": 0.5}, {"services": services, "biases": biases}, draft)
+    body = json.loads(text)
+    ctx = body["catalog_snippets"]
+    assert text == prompts.dumps(body) and "b" not in body["intake_facts"]
+    assert prompts.count_tokens(prompts.dumps(ctx)) <= 120 + len(ctx["services"]) + len(ctx["biases"])
+    assert ctx["services"][0]["service_id"] == "s0" and ctx["biases"][0]["key"] == "b0" and len(ctx["biases"]) > 1
+    assert "constraints" not in text and "price_band" not in text and "list_price" not in text
+
+STREAM_ANSWERS = {"propertyType":"Condo","interiorSizeSqft":640,"tightRooms":True,"occupancy":"occupied"}
+
+def _streamed_decision():
+    from app.services.llm_decider import _offline_decision
+    dec = _offline_decision()
+    # High asks for staging in an occupied home and forgets the floor plan the tight rooms need
+    dec["stacks"][0]["services"].append({"service_id":"virtual_staging","name":"Virtual Staging","rationale":"Staged rooms."})
+    return dec
+
+def test_stream_emits_guardrailed_items_as_the_llm_streams(monkeypatch, fake_llm):
+    import asyncio, json
+    from app.services import llm_decider
+    log = []
+    text = json.dumps(_streamed_decision())
+    async def stream(answers, sigs, ctx, draft):
+        for i in range(0, len(text), 16):
+            log.append("chunk")
+            await asyncio.sleep(0)
+            yield text[i:i + 16]
+        log.append("end")
+    monkeypatch.setattr(llm_decider, "_stream_llm", stream)
+    async def run():
+        out = []
+        async for kind, data in llm_decider.decide_stream(dict(STREAM_ANSWERS), {"complexity":0.5}, mode="lighting", refine=True):
+            log.append(kind)
+            out.append((kind, data))
+        return out
+    events = asyncio.run(run())
+    # every stack and bias was yielded while chunks were still arriving
+    assert [k for k, _ in events] == ["stack"] * 3 + ["bias"] * 3 + ["done"]
+    assert log.index("end") > max(i for i, k in enumerate(log) if k in ("stack", "bias"))
+    assert log.index("stack") < log.index("bias") < log.index("end")
+    for kind, st in events[:3]:
+        ids = [s["service_id"] for s in st["services"]]
+        assert "2d_floor_plan" in ids and "virtual_staging" not in ids
+    done = events[-1][1]
+    assert done["source"] == "llm" and not done["fallback"]
+    assert done["stacks"] == [st for _, st in events[:3]] and done["biases"] == [b for k, b in events if k == "bias"]
+    assert [st["tier"] for st in done["stacks"]] == ["High", "Medium", "Low"]
+
+def test_array_item_parser_ignores_quotes_and_brackets_inside_strings():
+    import json
+    from app.services.json_stream import ArrayItemParser
+    doc = {"note": "a [fake] {array}", "stacks": [{"tier": "High", "rationale": 'say "}] hi" \\ ok'},
+                                                 {"tier": "Low", "rationale": "[{\"x\": 1}]"}],
+           "biases": [{"key": "fluency", "why": "}{"}]}
+    text, parser, items = json.dumps(doc), ArrayItemParser(), []
+    for c in text:  # one character at a time: escapes and quotes split across chunks
+        items += list(parser.feed(c))
+    assert items == [("stacks", doc["stacks"][0]), ("stacks", doc["stacks"][1]), ("biases", doc["biases"][0])]
+    assert parser.result() == doc
+
+@pytest.mark.parametrize("failure", ["stall", "error"])
+def test_stream_falls_back_to_the_draft_within_budget(monkeypatch, fake_llm, failure):
+    import asyncio, json, time
+    from app.config import settings
+    from app.services import llm_decider
+    monkeypatch.setattr(settings, "LLM_BUDGET_LIGHTING_S", 0.2)
+    llm_decider.decision_cache.clear()
+    text = json.dumps(_streamed_decision())
+    async def stream(answers, sigs, ctx, draft):
+        yield text[:len(text) // 2]  # the first stack parses, then the stream goes wrong
+        if failure == "stall":
+            await asyncio.sleep(30)
+        raise ConnectionError("reset by peer")
+    monkeypatch.setattr(llm_decider, "_stream_llm", stream)
+    async def run():
+        return [e async for e in llm_decider.decide_stream(dict(STREAM_ANSWERS), {"complexity":0.5},
+                                                           mode="lighting", refine=True)]
+    t0 = time.perf_counter()
+    events = asyncio.run(run())
+    assert time.perf_counter() - t0 < 2
+    kind, done = events[-1]
+    assert kind == "done" and done["fallback"] and done["source"] == "planner"
+    snap = llm_decider.kb_store.get_snapshot()
+    draft = llm_decider._draft(dict(STREAM_ANSWERS), {"complexity":0.5}, snap)
+    assert done == llm_decider._finalize(dict(STREAM_ANSWERS), draft, snap, "failed")
+    assert llm_decider.decision_cache.get(llm_decider._cache_key(STREAM_ANSWERS, {"complexity":0.5}, snap.version)) is None
+
+def test_planner_ranks_ingested_price_bands_by_fit():
+    from dataclasses import replace
+    from app.services import kb_store, planner, rules, signals
+    # shaped like ingest_docx output: "$" bands or "unknown", catalog order unrelated to fit
+    catalog = [
+        {"service_id":"aerials","name":"Aerials","compatible_biases":["authority"],"price_band":"unknown"},
+        {"service_id":"show_stopper","name":"Show Stopper","compatible_biases":["anchoring"],"price_band":"$$$"},
+        {"service_id":"quick_snaps","name":"Quick Snaps","compatible_biases":[],"price_band":"unknown"},
+        {"service_id":"2d_floor_plan","name":"2D Floor Plan","compatible_biases":["fluency"],"price_band":"$$"},
+        {"service_id":"zillow_3d","name":"Zillow 3D","compatible_biases":["fluency"],"price_band":" $$ "},
+    ]
+    assert [planner._band(s) for s in catalog] == [1, 2, 1, 1, 1]
+    snap = kb_store.get_snapshot()
+    snap = replace(snap, services=catalog, rules=rules.compile_rules(rules.default_spec(), catalog))
+    answers = {"propertyType":"Condo","interiorSizeSqft":620,"tightRooms":True,"conditionBand":"dated"}
+    stacks = {st["tier"]: [s["service_id"] for s in st["services"]]
+              for st in planner.plan(answers, signals.compute(answers), snap)["stacks"]}
+    # no "$" service: Low ranks the cheapest band present by fit, not by catalog order
+    assert sorted(stacks["Low"]) == ["2d_floor_plan", "zillow_3d"]
+    assert stacks["Low"] == stacks["Medium"][:2] and "show_stopper" in stacks["High"]
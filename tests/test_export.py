@@ -1,3 +1,5 @@
+import pytest, time
+
 def test_export_docx(client):
     # Deep-dive intake
     payload = {"answers":{"propertyType":"SFR","beds":3,"baths":2.0,"interiorSizeSqft":1800,"conditionBand":"updated",
@@ -8,3 +10,125 @@ def test_export_docx(client):
     r2 = client.post("/export/docx", json={"intake_id":iid,"chosen_tier":"High","chosen_bias_key":"fluency"})
     assert r2.status_code==200
     assert r2.json()["downloadUrl"].endswith(".docx")
+
+def test_repeat_export_reuses_files(client):
+    payload = {"answers":{"propertyType":"Condo","beds":2,"baths":1.0,"interiorSizeSqft":900,"conditionBand":"dated",
+                          "tightRooms":True,"naturalLight":"mixed","occupancy":"vacant","quirkyFlow":False,"signatureFeature":"Balcony",
+                          "likelyBuyer":"first_time","locationPerk":"walkable","timelinePressure":"high","agentOnCamComfort":"low","showingWindow":"lunch"}}
+    iid = client.post("/intake/deep-dive", json=payload).json()["intake_id"]
+    req = {"intake_id":iid,"chosen_tier":"Low","chosen_bias_key":"fluency"}
+    first = client.post("/export/docx", json=req).json()
+    for _ in range(100):
+        if client.get(first["statusUrl"]).json()["status"] == "done":
+            break
+        time.sleep(0.05)
+    second = client.post("/export/docx", json=req).json()
+    assert second["cached"] and second["downloadUrl"] == first["downloadUrl"]
+    assert second["jobId"] != first["jobId"]
+
+def test_export_rejects_unknown_tier(client):
+    payload = {"answers":{"propertyType":"SFR","interiorSizeSqft":2100,"conditionBand":"average"}}
+    iid = client.post("/intake/deep-dive", json=payload).json()["intake_id"]
+    req = {"intake_id":iid,"chosen_tier":"Ultra","chosen_bias_key":"fluency"}
+    for params in ({}, {"inline":"true"}):
+        r = client.post("/export/docx", params=params, json=req)
+        assert r.status_code==422 and "High" in r.json()["detail"]
+    assert client.get(f"/intakes/{iid}/exports").json()["items"] == []
+    # tiers match case-insensitively, as the renderer does
+    assert client.post("/export/docx", json={**req, "chosen_tier":"high"}).status_code==200
+
+# copy pack exercising tabs/newlines, nesting past each section's heading depth, and the
+# sections the layout has to fill in from defaults (no cadence, no kpis)
+EDGE_PACK = {
+    "core_listing_print": {
+        "MLS": {"Headline": "Corner lot\tnear parks", "Remarks": {"Short": ["One\ttwo", "a\nb"],
+                                                                "Long": {"Too": "deep", "Tabs": ["x\ty"]}}},
+        "Flyer": ["\tIndented", "Trailing\t"],
+        "Sign rider": "Call today",
+    },
+    "digital_social": {"Instagram": {"Caption": "Line 1\nLine 2\tend", "Carousel": {"Slide 1": "Hero"}},
+                       "Hashtags": ["#home", "#\tlisting"]},
+    "direct_outreach": {"Email": {"Subject": "Just listed", "Body": ["Hi\tthere"]}, "Postcard": "Front\tback"},
+    "ops_checklists": {"Shoot day": ["Lights on", "Blinds\tup"], "Notes": "Keys in lockbox",
+                       "Nested": {"a": ["b"]}},
+    "disclaimers": {"fair_housing": "Equal\topportunity.", "school_info": ""},
+}
+
+@pytest.mark.parametrize("pack_name", ["offline", "edge"])
+def test_template_renderer_matches_legacy_layout(pack_name):
+    from docx.oxml.ns import qn
+    from app.models import Intake
+    from app.services import copywriter, export_docx, llm_decider
+    from benchmarks.bench_docx import legacy_render
+    dec = llm_decider._offline_decision()
+    intake = Intake(id="x", mode="deep_dive", answers={}, signals={}, stacks=dec["stacks"], biases=dec["biases"])
+    pack = copywriter._offline_pack() if pack_name == "offline" else EDGE_PACK
+    # style plus the run's children (w:t text, w:tab, w:br), not just the flattened text
+    runs = lambda p: [(c.tag, c.text) for r in p._p.iter(qn("w:r")) for c in r]
+    dump = lambda d: [(p.style.name, runs(p)) for p in d.paragraphs]
+    new = export_docx.render(export_docx.proposal_paragraphs(intake, pack, "Medium", "fluency"))
+    assert dump(new) == dump(legacy_render(intake, pack, "Medium", "fluency"))
+
+def test_inline_export_streams_docx_with_etag(client):
+    payload = {"answers":{"propertyType":"Townhome","interiorSizeSqft":1300,"conditionBand":"pristine"}}
+    iid = client.post("/intake/deep-dive", json=payload).json()["intake_id"]
+    req = {"intake_id":iid,"chosen_tier":"High","chosen_bias_key":"anchoring"}
+    r = client.post("/export/docx", params={"inline":"true"}, json=req)
+    assert r.status_code==200 and r.content[:2]==b"PK"
+    assert int(r.headers["content-length"])==len(r.content) and "attachment" in r.headers["content-disposition"]
+    r2 = client.post("/export/docx", params={"inline":"true"}, json=req, headers={"If-None-Match": r.headers["etag"]})
+    assert r2.status_code==304
+
+def test_preview_html_and_md(client):
+    payload = {"answers":{"propertyType":"Condo","interiorSizeSqft":900,"conditionBand":"average"}}
+    iid = client.post("/intake/deep-dive", json=payload).json()["intake_id"]
+    job = client.post("/export/docx", json={"intake_id":iid,"chosen_tier":"Low","chosen_bias_key":"scarcity"}).json()
+    for _ in range(100):
+        md = client.get(f"/export/{job['jobId']}/preview", params={"format":"md"})
+        if md.status_code != 202:
+            break
+        time.sleep(0.05)
+    md = client.get(f"/export/{job['jobId']}/preview", params={"format":"md"})
+    assert md.status_code==200 and md.text.startswith("# Proposal + Listing Lingo Pack")
+    assert "## I. Core Listing & Print" in md.text and "## Disclaimers" in md.text
+    h = client.get(f"/export/{job['jobId']}/preview")
+    assert h.headers["content-type"].startswith("text/html") and "<h2>KPIs (Simple)</h2>" in h.text
+    assert client.get(f"/export/{job['jobId']}/preview", headers={"If-None-Match": h.headers["etag"]}).status_code==304
+
+def test_job_renders_under_key_pinned_at_submit(client):
+    import asyncio
+    from app.deps import save
+    from app.models import ExportJob
+    from app.services import export_jobs
+    iid = client.post("/intake/deep-dive", json={"answers":{"propertyType":"SFR"}}).json()["intake_id"]
+    # e.g. the KB was reloaded between submit and run: the job still writes the file it promised
+    job = ExportJob(intake_id=iid, chosen_tier="Medium", chosen_bias_key="fluency", export_key="pinnedkey")
+    save(job)
+    asyncio.run(export_jobs.run_job(job.id))
+    st = client.get(f"/export/jobs/{job.id}").json()
+    assert st["status"] == "done" and st["downloadUrl"] == f"/exports/pinnedkey_{iid}.docx"
+
+def test_inline_fallback_export_is_not_cacheable(client, monkeypatch):
+    from app.services import copywriter
+    async def offline(**kw):
+        return dict(copywriter._offline_pack(), fallback=True)
+    monkeypatch.setattr(copywriter, "generate", offline)
+    iid = client.post("/intake/deep-dive", json={"answers":{"propertyType":"Ranch","interiorSizeSqft":1111}}).json()["intake_id"]
+    req = {"intake_id":iid,"chosen_tier":"High","chosen_bias_key":'odd"key\r\nX-Injected: 1'}
+    r = client.post("/export/docx", params={"inline":"true"}, json=req)
+    assert r.status_code==200 and "etag" not in r.headers and r.headers["cache-control"]=="no-store"
+    assert "x-injected" not in r.headers
+    assert r.headers["content-disposition"].startswith('attachment; filename="proposal_High_odd_key__X-Injected__1.docx"')
+
+def test_preview_never_generates_copy(client, monkeypatch):
+    from app.services import copywriter
+    async def offline(**kw):
+        return dict(copywriter._offline_pack(), fallback=True)
+    monkeypatch.setattr(copywriter, "generate", offline)
+    iid = client.post("/intake/deep-dive", json={"answers":{"propertyType":"Loft","interiorSizeSqft":777}}).json()["intake_id"]
+    job = client.post("/export/docx", params={"inline":"true"},
+                      json={"intake_id":iid,"chosen_tier":"Low","chosen_bias_key":"fluency"}).headers["x-export-job-id"]
+    async def boom(**kw):
+        raise AssertionError("preview must not generate copy")
+    monkeypatch.setattr(copywriter, "generate", boom)
+    assert client.get(f"/export/{job}/preview").status_code == 409
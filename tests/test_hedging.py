@@ -0,0 +1,37 @@
+import asyncio, pytest
+from app.config import settings
+from app.services import llm_decider
+from app.services.hedging import LatencyTracker, hedged
+
+def test_hedge_wins_when_first_call_stalls(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER_S", 0.05)
+    calls = []
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return len(calls)
+    assert asyncio.run(hedged(call, 0.5, LatencyTracker())) == 2
+
+def test_failed_attempt_is_retried_then_budget_enforced(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER_S", 10.0)
+    calls = []
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("bad json")
+        return "ok"
+    assert asyncio.run(hedged(flaky, 1.0, LatencyTracker())) == "ok"
+    async def slow():
+        await asyncio.sleep(1.0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(hedged(slow, 0.05, LatencyTracker()))
+
+def test_decide_falls_back_when_budget_exceeded(monkeypatch, fake_llm):
+    async def slow(*a, **kw):
+        await asyncio.sleep(1.0)
+    monkeypatch.setattr(llm_decider, "_call_llm", slow)
+    llm_decider.decision_cache.clear()
+    out = asyncio.run(llm_decider.decide({"propertyType":"Condo","tightRooms":True}, {"x":1}, "lighting", budget_s=0.05,
+                                            refine=True))
+    assert out["fallback"] and out["source"] == "planner" and len(out["stacks"]) == 3
+    assert llm_decider.decision_cache.stats()["size"] == 0
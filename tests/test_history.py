@@ -0,0 +1,29 @@
+from app.deps import engine
+from sqlalchemy import text
+
+def test_intake_listing_keyset_pagination(client):
+    ids = []
+    for size in (700, 710, 720):
+        r = client.post("/intake/deep-dive", json={"answers":{"propertyType":"Condo","interiorSizeSqft":size,"ref":"hist"}})
+        ids.append(r.json()["intake_id"])
+    page1 = client.get("/intakes", params={"mode":"deep_dive","limit":2}).json()
+    assert len(page1["items"]) == 2 and page1["nextCursor"]
+    assert "answers" not in page1["items"][0] and "signals" in page1["items"][0]
+    page2 = client.get("/intakes", params={"mode":"deep_dive","limit":2,"cursor":page1["nextCursor"],
+                                           "include":["answers"]}).json()
+    seen = [i["id"] for i in page1["items"] + page2["items"]]
+    assert len(seen) == len(set(seen)) and "answers" in page2["items"][0]
+    assert seen[:2] == ids[::-1][:2]
+    assert client.get("/intakes", params={"cursor":"garbage"}).status_code == 400
+
+def test_intake_exports_listing(client):
+    iid = client.post("/intake/deep-dive", json={"answers":{"propertyType":"SFR","interiorSizeSqft":1500}}).json()["intake_id"]
+    client.post("/export/docx", json={"intake_id":iid,"chosen_tier":"Medium","chosen_bias_key":"fluency"})
+    js = client.get(f"/intakes/{iid}/exports").json()
+    assert len(js["items"]) == 1 and js["items"][0]["intake_id"] == iid and js["nextCursor"] is None
+    assert client.get("/intakes/nope/exports").status_code == 404
+
+def test_history_indexes_exist():
+    with engine.connect() as conn:
+        names = {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))}
+    assert {"ix_intake_created_at", "ix_intake_mode_created_at", "ix_exportjob_intake_id"} <= names
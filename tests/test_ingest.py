@@ -0,0 +1,121 @@
+import os, zipfile
+from docx import Document
+from docx.oxml import OxmlElement
+from app.services import ingest_docx
+
+def _services_docx(path):
+    doc = Document()
+    doc.add_heading("Services 2026", 0)
+    for i in range(3):
+        doc.add_heading(f"Aerial Package {i}", 1 + i % 2)
+        doc.add_paragraph("- Drone stills")
+        doc.add_paragraph("Constraints: needs FAA clearance; weather dependent")
+        doc.add_paragraph("Price: $$")
+        doc.add_paragraph("Biases: Anchoring, Scarcity")
+        p = doc.add_paragraph("Twilight\tadd-on")
+        p.add_run().add_break()
+        p.add_run("second line")
+        link = OxmlElement("w:hyperlink")
+        r = OxmlElement("w:r"); t = OxmlElement("w:t"); t.text = " see portfolio"
+        r.append(t); link.append(r); p._p.append(link)
+        doc.add_paragraph("")
+        doc.add_table(rows=1, cols=2).cell(0, 0).text = "Table text is not a paragraph"
+    doc.save(path)
+
+def _biases_docx(path):
+    doc = Document()
+    for name in ("Anchoring", "Social Proof"):
+        doc.add_heading(f"{name} — the effect", 1)
+        doc.add_paragraph("Definition: first number sticks")
+        doc.add_paragraph("Copy: Was $X; Now $Y")
+        doc.add_paragraph("Cadence: Day 1 teaser; Day 3 reveal")
+        doc.add_paragraph("Compatible: Aerial Package 0, Twilight Photos")
+        doc.add_paragraph("Extra copy line", style="List Bullet")
+    doc.save(path)
+
+def test_streaming_ingest_matches_python_docx(tmp_path):
+    svc, bias = str(tmp_path / "services.docx"), str(tmp_path / "biases.docx")
+    _services_docx(svc); _biases_docx(bias)
+    assert list(ingest_docx._stream_paragraphs(svc)) == list(ingest_docx._docx_paragraphs(svc))
+    services = ingest_docx.parse_services(svc)
+    assert services == ingest_docx._parse_services_docx(svc) and len(services) == 4
+    assert services[1]["constraints"] == ["needs FAA clearance", "weather dependent"]
+    assert ingest_docx.parse_biases(bias) == ingest_docx._parse_biases_docx(bias)
+
+def test_incremental_rebuild_reuses_unchanged_sections(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.services import kb_store
+    svc, bias = str(tmp_path / "services.docx"), str(tmp_path / "biases.docx")
+    _services_docx(svc); _biases_docx(bias)
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(settings, "KB_SQLITE_PATH", str(tmp_path / "kb.sqlite"))
+    monkeypatch.setattr(settings, "CATALOG_DOCX_PATH", svc)
+    monkeypatch.setattr(settings, "BIASES_DOCX_PATH", bias)
+    monkeypatch.setattr(settings, "SKU_XLSX_PATH", str(tmp_path / "none.xlsx"))
+    first = ingest_docx.build_kb_files()
+    assert first["build"]["catalog"] == {"changed": True, "derived": 4, "reused": 0}
+    assert first["counts"] == {"services": 4, "biases": 2, "prices": 0}
+    assert first["version"] == kb_store._load_snapshot(vectors=False).version
+    assert ingest_docx.build_kb_files()["build"]["catalog"]["changed"] is False
+
+    doc = Document(svc)
+    doc.paragraphs[-1].text = "Price: $$$"  # last service section only
+    doc.save(svc)
+    third = ingest_docx.build_kb_files()
+    assert third["build"]["catalog"] == {"changed": True, "derived": 1, "reused": 3}
+    assert third["build"]["biases"]["changed"] is False
+    services = kb_store._load_snapshot(vectors=False).services
+    assert services == ingest_docx.parse_services(svc) and services[-1]["price_band"] == "$$$"
+    assert ingest_docx.read_manifest()["version"] == third["version"] != first["version"]
+    assert not [f for f in os.listdir(settings.DATA_DIR) if f.endswith(".tmp")]
+
+def _sku_xlsx(path, rows):
+    # minimal SpreadsheetML package: shared strings for text, inline numbers, one sheet
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    strings, cells = [], []
+    for r, row in enumerate(rows, 1):
+        cs = []
+        for c, v in enumerate(row):
+            ref = f"{chr(65 + c)}{r}"
+            if isinstance(v, str):
+                strings.append(v)
+                cs.append(f'<c r="{ref}" t="s"><v>{len(strings) - 1}</v></c>')
+            elif v is not None:
+                cs.append(f'<c r="{ref}"><v>{v}</v></c>')
+        cells.append(f'<row r="{r}">{"".join(cs)}</row>')
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("xl/workbook.xml", f'<workbook {ns} xmlns:r="http://schemas.openxmlformats.org/'
+                   'officeDocument/2006/relationships"><sheets><sheet name="Prices" sheetId="1" r:id="rId1"/>'
+                   '</sheets></workbook>')
+        z.writestr("xl/_rels/workbook.xml.rels", '<Relationships xmlns="http://schemas.openxmlformats.org/'
+                   'package/2006/relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+                   '</Relationships>')
+        z.writestr("xl/sharedStrings.xml", f'<sst {ns}>' + "".join(f"<si><t>{t}</t></si>" for t in strings) + "</sst>")
+        z.writestr("xl/worksheets/sheet1.xml", f'<worksheet {ns}><sheetData>{"".join(cells)}</sheetData></worksheet>')
+
+def test_sku_price_index_joins_into_kb_and_stacks(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.services import ingest_xlsx, kb_store, llm_decider
+    xlsx = str(tmp_path / "skus.xlsx")
+    _sku_xlsx(xlsx, [[None], ["Service", "SKU", "List Price", "Tier"],
+                     ["Aerials", 1001, 450, "High"], ["Show Stopper", "VUE-SS", "$1,200.50", "High"],
+                     ["Aerials", 9999, 1, "Low"]])
+    assert ingest_xlsx.parse_prices(xlsx) == {
+        "aerials": {"sku": "1001", "list_price": 450.0, "tier": "High"},
+        "show_stopper": {"sku": "VUE-SS", "list_price": 1200.5, "tier": "High"}}
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path / "kb"))
+    monkeypatch.setattr(settings, "KB_SQLITE_PATH", str(tmp_path / "kb.sqlite"))
+    monkeypatch.setattr(settings, "CATALOG_DOCX_PATH", str(tmp_path / "none.docx"))
+    monkeypatch.setattr(settings, "BIASES_DOCX_PATH", str(tmp_path / "none.docx"))
+    monkeypatch.setattr(settings, "SKU_XLSX_PATH", xlsx)
+    assert ingest_docx.build_kb_files()["counts"]["prices"] == 2
+    assert kb_store.price_of("aerials")["list_price"] == 450.0 and kb_store.price_of("nope") is None
+    stack = llm_decider._finalize_stack({}, llm_decider._offline_decision()["stacks"][0])
+    assert stack["total"] == 1650.5 and stack["services"][0]["sku"] == "VUE-SS"
+    from app.models import Intake
+    from app.services import export_docx
+    paras = export_docx.proposal_paragraphs(Intake(id="x", mode="deep_dive", answers={}, signals={},
+                                                   stacks=[stack], biases=[]), {}, "High", "anchoring")
+    assert (None, "Stack total: $1,650.50") in paras
+    monkeypatch.undo()
+    kb_store.build_or_refresh()
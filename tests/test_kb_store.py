@@ -0,0 +1,108 @@
+import json, os
+import numpy as np
+from app.config import settings
+from app.services import kb_store
+
+def _write(d, services, biases):
+    with open(os.path.join(d, "catalog.json"), "w") as f:
+        json.dump({"services": services}, f)
+    with open(os.path.join(d, "biases.json"), "w") as f:
+        json.dump({"biases": biases}, f)
+
+def test_snapshot_reused_until_files_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "KB_SQLITE_PATH", str(tmp_path / "kb.sqlite"))
+    _write(tmp_path, [{"service_id":"aerials","name":"Aerials"}], [{"key":"fluency","name":"Fluency"}])
+    kb_store.build_or_refresh()
+    a = kb_store.get_snapshot()
+    assert kb_store.get_snapshot() is a
+    _write(tmp_path, [{"service_id":"aerials","name":"Aerials"},{"service_id":"quick_snaps","name":"Quick Snaps"}], [])
+    b = kb_store.get_snapshot()
+    assert b is not a and len(b.services) == 2 and b.version != a.version
+    monkeypatch.undo()
+    kb_store.build_or_refresh()
+
+def test_bm25_ranks_matching_docs_first():
+    from app.services.bm25 import BM25Index
+    idx = BM25Index(["Aerials drone stills", "2D Floor Plan schematic plan", "Quick Snaps fast images"])
+    top = idx.top("tightRooms:True floor plan", 3)
+    assert top[0][0] == 1 and len(top) == 3
+
+def test_retrieve_context_contract():
+    ctx = kb_store.retrieve_context({"propertyType":"Condo","tightRooms":True}, k=4)
+    assert len(ctx["services"]) == 4 and len(ctx["biases"]) == 4
+
+def test_vector_retrieval_embeds_only_changed_docs(tmp_path, monkeypatch):
+    from app.services import embeddings
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "KB_SQLITE_PATH", str(tmp_path / "kb.sqlite"))
+    monkeypatch.setattr(settings, "KB_RETRIEVER", "vector")
+    services = [{"service_id":"2d_floor_plan","name":"2D Floor Plan","deliverables":["Schematic plan"]},
+                {"service_id":"aerials","name":"Aerials","deliverables":["Drone stills"]},
+                {"service_id":"quick_snaps","name":"Quick Snaps","deliverables":["Fast-turn images"]}]
+    _write(tmp_path, services, [{"key":"fluency","name":"Fluency","definition":"Reduce cognitive load."}])
+    kb_store.build_or_refresh()
+    snap = kb_store.get_snapshot()
+    assert snap.service_vecs.dtype == np.float32 and snap.service_vecs.flags["C_CONTIGUOUS"]
+    assert kb_store.retrieve_context({"want":"drone aerials"}, k=3)["services"][0]["service_id"] == "aerials"
+    services[2]["deliverables"] = ["Same-day images"]
+    _write(tmp_path, services, [{"key":"fluency","name":"Fluency","definition":"Reduce cognitive load."}])
+    fresh = kb_store._load_snapshot(vectors=False)
+    assert embeddings.sync({**kb_store._service_docs(fresh), **kb_store._bias_docs(fresh)}) == 1
+    # a file change outside /admin/reload-kb is embedded in the background, not left on BM25
+    services[0]["deliverables"] = ["Measured plan"]
+    _write(tmp_path, services, [{"key":"fluency","name":"Fluency","definition":"Reduce cognitive load."}])
+    assert kb_store.get_snapshot().service_vecs is None
+    kb_store._reload_pool.submit(lambda: None).result()
+    assert kb_store.get_snapshot().service_vecs is not None
+    monkeypatch.undo()
+    kb_store.build_or_refresh()
+
+def test_background_reload_swaps_snapshot(client, tmp_path, monkeypatch):
+    import time
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "KB_SQLITE_PATH", str(tmp_path / "kb.sqlite"))
+    for name in ("CATALOG_DOCX_PATH", "BIASES_DOCX_PATH", "SKU_XLSX_PATH"):
+        monkeypatch.setattr(settings, name, str(tmp_path / "missing"))
+    _write(tmp_path, [{"service_id":"aerials","name":"Aerials"}], [])
+    old = kb_store.get_snapshot()
+    kb_store._reloading.set()
+    try:
+        # files rewritten mid-reload: readers keep the snapshot they had
+        _write(tmp_path, [{"service_id":"aerials","name":"Aerials"},{"service_id":"twilight","name":"Twilight"}], [])
+        assert kb_store.get_snapshot() is old
+    finally:
+        kb_store._reloading.clear()
+
+    r = client.post("/admin/reload-kb").json()
+    for _ in range(100):
+        st = client.get(r["statusUrl"]).json()
+        if st["status"] in ("done", "error"):
+            break
+        time.sleep(0.02)
+    assert st["status"] == "done" and st["counts"]["services"] == 2
+    assert st["kbVersion"] == kb_store.get_snapshot().version != old.version
+    out = client.post("/intake/lighting", json={"answers": {"propertyType": "Condo"}}).json()
+    assert out["kbVersion"] == st["kbVersion"]
+    assert client.get("/admin/reload-kb/nope").status_code == 404
+    monkeypatch.undo()
+    kb_store.build_or_refresh()
+
+def test_openai_embeddings_are_requested_in_chunks(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    from app.services import embeddings, llm_client
+    sizes = []
+    def create(model, input):
+        sizes.append(len(input))
+        # returned out of order on purpose: rows are matched back by index
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(t)), 1.0])
+                                     for i, t in reversed(list(enumerate(input)))])
+    monkeypatch.setattr(llm_client, "get_sync_client", lambda: SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+    monkeypatch.setattr(settings, "KB_EMBEDDER", "openai")
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(embeddings, "EMBED_BATCH", 2)
+    docs = {f"service:s{i}": "x" * (i + 1) for i in range(5)}
+    path = str(tmp_path / "kb.sqlite")
+    assert embeddings.sync(docs, path) == 5 and sizes == [2, 2, 1]
+    m = embeddings.load_matrix(docs, path)
+    assert m.shape == (5, 2) and np.all(np.argsort(m[:, 0]) == np.arange(5))
@@ -0,0 +1,52 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import metrics
+
+PAYLOAD = {"answers": {"propertyType": "Condo", "interiorSizeSqft": 700, "tightRooms": True,
+                       "likelyBuyer": "remote_buyer", "timelinePressure": "high"}}
+
+def test_metrics_endpoint_reports_stage_histograms_and_counters(client, fake_llm):
+    metrics.reset()
+    assert client.post("/intake/lighting", json=PAYLOAD).status_code == 200
+    assert client.post("/intake/lighting?refine=true", json=PAYLOAD).status_code == 200
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    for stage in ("signals", "retrieve", "llm", "validate", "db_commit"):
+        assert f'launchpad_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'launchpad_stage_seconds_bucket{stage="signals",le="+Inf"} 2' in text
+    assert "# TYPE launchpad_decision_cache_total counter" in text
+    assert 'launchpad_decision_cache_total{result=' in text
+
+def test_server_timing_header_lists_stages():
+    with TestClient(metrics.ServerTimingMiddleware(app)) as c:
+        r = c.post("/intake/lighting", json=PAYLOAD)
+    names = [part.split(";")[0] for part in r.headers["server-timing"].split(", ")]
+    assert names[0] == "signals" and "db_commit" in names and names[-1] == "total"
+
+def test_single_flight_exports_gauges_and_counters():
+    import asyncio
+    from app.services.cache import SingleFlight
+    metrics.reset()
+    sf = SingleFlight("t")
+    async def work(fail=False):
+        await asyncio.sleep(0.02)
+        if fail:
+            raise RuntimeError("boom")
+        return 1
+    async def run():
+        calls = asyncio.gather(*(sf.do("k", work) for _ in range(3)))
+        await asyncio.sleep(0)
+        during = metrics.render()
+        await calls
+        await asyncio.gather(sf.do("e", lambda: work(True)), return_exceptions=True)
+        return during
+    during = asyncio.run(run())
+    assert "# TYPE launchpad_singleflight_inflight gauge" in during
+    assert 'launchpad_singleflight_inflight{flight="t"} 1' in during
+    assert 'launchpad_singleflight_waiters{flight="t"} 3' in during
+    after = metrics.render()
+    assert 'launchpad_singleflight_inflight{flight="t"} 0' in after and 'launchpad_singleflight_waiters{flight="t"} 0' in after
+    assert 'launchpad_singleflight_calls_total{flight="t"} 2' in after
+    assert 'launchpad_singleflight_shared_total{flight="t"} 2' in after
+    assert 'launchpad_singleflight_errors_total{flight="t"} 1' in after
@@ -0,0 +1,43 @@
+import itertools
+from app.services import rules
+
+def _legacy(answers, proposed):
+    # the hard-coded guardrails the rule set replaced
+    out = []
+    for s in proposed:
+        sid = s.get("service_id", "")
+        if sid == "virtual_staging" and answers.get("occupancy") != "vacant" and not answers.get("explicitVirtualStagingOK", False):
+            continue
+        if sid == "exterior_only" and not answers.get("busy_street_special_case", False):
+            continue
+        out.append(s)
+    if answers.get("tightRooms") and all(s.get("service_id") != "2d_floor_plan" for s in out):
+        out.insert(0, {"service_id":"2d_floor_plan","name":"2D Floor Plan","rationale":"Tight rooms benefit from schematic clarity."})
+    if answers.get("likelyBuyer") == "remote_buyer" and all(s.get("service_id") != "zillow_3d" for s in out):
+        out.insert(0, {"service_id":"zillow_3d","name":"Zillow 3D Tour","rationale":"Remote buyers need spatial continuity."})
+    return out
+
+def test_default_rules_match_legacy_guardrails():
+    compiled = rules.compile_rules(rules.default_spec(), [])
+    stacks = [[{"service_id": sid, "name": sid, "rationale": ""} for sid in ids] for ids in
+              (["virtual_staging", "aerials"], ["exterior_only", "2d_floor_plan"], ["zillow_3d"], [])]
+    for occ, ok, busy, tight, buyer in itertools.product(["vacant", "occupied"], [False, True], [False, True],
+                                                        [False, True], ["remote_buyer", "local"]):
+        answers = {"occupancy": occ, "explicitVirtualStagingOK": ok, "busy_street_special_case": busy,
+                   "tightRooms": tight, "likelyBuyer": buyer}
+        assert compiled.apply_stacks(answers, stacks) == [_legacy(answers, st) for st in stacks]
+
+def test_catalog_constraints_and_new_rules_need_no_code():
+    spec = {"constraints": {"needs_yard": {"field": "hasYard", "truthy": True},
+                            "not_winter": {"not": {"field": "season", "in": ["winter"]}}},
+            "require": {"aerials": ["not_winter"]},
+            "ensure": [{"when": {"all": [{"field": "hasYard", "eq": True}, {"field": "season", "eq": "summer"}]},
+                        "service": {"service_id": "twilight", "name": "Twilight", "rationale": "Long evenings."}}]}
+    catalog = [{"service_id": "lawn_drone", "constraints": ["needs_yard", "free text note"]}]
+    compiled = rules.compile_rules(spec, catalog)
+    stack = [{"service_id": "lawn_drone"}, {"service_id": "aerials"}]
+    assert compiled.apply({"season": "winter"}, stack) == []
+    assert [s["service_id"] for s in compiled.apply({"hasYard": True, "season": "summer"}, stack)] == \
+        ["twilight", "lawn_drone", "aerials"]
+    batch = compiled.apply_batch([({"season": "winter"}, [stack]), ({"hasYard": True}, [stack, []])])
+    assert batch == [[[]], [stack, []]]
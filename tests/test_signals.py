@@ -0,0 +1,30 @@
+import random
+import numpy as np
+from app.services import signals
+
+def test_batch_matches_per_row_bit_for_bit():
+    rng = random.Random(7)
+    rows = []
+    for _ in range(5000):
+        a = {}
+        if rng.random() < 0.9:
+            a["interiorSizeSqft"] = rng.choice([rng.randint(0, 9000), round(rng.uniform(0, 9000), rng.randint(0, 4)),
+                                                str(rng.randint(300, 5000)), 2.5, 1e7 + 0.5, float("inf")])
+        for k, table in (("conditionBand", signals.CONDITION), ("naturalLight", signals.NATURAL),
+                         ("timelinePressure", signals.TIMELINE), ("priority", signals.TIMELINE)):
+            if rng.random() < 0.8:
+                a[k] = rng.choice(list(table) + ["unknown", None])
+        if rng.random() < 0.7:
+            a["tightRooms"] = rng.choice([True, False, 0, 1, "no", None])
+        if rng.random() < 0.5:
+            a["propertyType"] = rng.choice(["Luxury", "Condo", None])
+        rows.append(a)
+    out = signals.compute_batch(signals.columns(rows))
+    for i, a in enumerate(rows):
+        assert {f: float(out[f][i]) for f in signals.FIELDS} == signals.compute(a), a
+
+def test_batch_takes_numpy_columns():
+    out = signals.compute_batch({"interiorSizeSqft": np.array([1200, 3999]),
+                                 "conditionBand": np.array(["dated", "pristine"])})
+    assert out["complexity"].tolist() == [signals.compute({"interiorSizeSqft": 1200, "conditionBand": "dated"})["complexity"],
+                                          signals.compute({"interiorSizeSqft": 3999, "conditionBand": "pristine"})["complexity"]]